@@ -0,0 +1,105 @@
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+
+from recipes.models import Recipe
+
+
+def _version_key(model):
+    return f'response-cache:{model._meta.label_lower}:version'
+
+
+def get_response_cache_version(model):
+    return cache.get_or_set(_version_key(model), uuid4().hex, None)
+
+
+def invalidate_response_cache(model):
+    """Делает недействительными все закэшированные ответы по модели."""
+    cache.set(_version_key(model), uuid4().hex, None)
+
+
+def _recipe_key(pk):
+    return f'recipe-payload:{pk}'
+
+
+def get_recipe_payloads(pks):
+    """Общие для всех пользователей представления рецептов по id."""
+    keys = {_recipe_key(pk): pk for pk in pks}
+    return {keys[key]: payload
+            for key, payload in cache.get_many(keys).items()}
+
+
+def set_recipe_payloads(payloads):
+    """Рецепты с необработанным изображением не кэшируются.
+
+    Их представление изменится, как только обработчик изображений
+    завершит задачу.
+    """
+    cache.set_many(
+        {_recipe_key(pk): payload for pk, payload in payloads.items()
+         if payload['image_status'] == Recipe.ImageStatus.READY},
+        settings.RECIPE_CACHE_TIMEOUT)
+
+
+def invalidate_recipe_payloads(pks):
+    cache.delete_many([_recipe_key(pk) for pk in pks])
+
+
+class CachedResponseMixin:
+    """Кэширует JSON-ответы list/retrieve и поддерживает ETag.
+
+    Ответ хранится в кэше уже отрендеренным вместе с сильным ETag и
+    заголовками, которые выставило представление. Ключ включает версию
+    модели, которая меняется при сохранении или удалении записей,
+    поэтому устаревшие ответы не отдаются.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request,
+                                    *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        model = self.get_queryset().model
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return (f'cached-response:{model._meta.label_lower}:'
+                f'{get_response_cache_version(model)}:{path}')
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = request.accepted_renderer.render(
+                response.data, request.accepted_media_type,
+                self.get_renderer_context())
+            headers = {header: value for header, value in response.items()
+                       if header != 'Content-Type'}
+            cached = (content, quote_etag(hashlib.sha256(content).hexdigest()),
+                      headers)
+            cache.set(key, cached, settings.RESPONSE_CACHE_TIMEOUT)
+        content, etag, headers = cached
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                content, content_type=request.accepted_renderer.media_type)
+        for header, value in headers.items():
+            response[header] = value
+        # Ответ выбран по Accept: JSON кэшируется отдельно от других
+        # форматов.
+        patch_vary_headers(response, ('Accept',))
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Кэш рецептов и ответов сбрасывается сигналами в процессе записи.
+
+    С кэшем в памяти процесса остальные воркеры gunicorn и обработчик
+    изображений этот сброс не видят и отдают устаревшие данные.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'Кэш по умолчанию хранится в памяти процесса: сброс кэша рецептов '
+        'и версий ответов не виден другим процессам.',
+        hint='Задайте общий кэш через CACHE_BACKEND и CACHE_LOCATION '
+             '(по умолчанию memcached).',
+        id='api.W001',
+    )]
@@ -1,24 +1,70 @@
+from django.db.models import Exists, OuterRef
 from django_filters import ModelMultipleChoiceFilter
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from recipes.search import search_recipes
 
 
 class RecipeFilter(FilterSet):
     tags = ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags',
+    )
+    author = filters.NumberFilter(field_name='author_id')
+    is_favorited = filters.BooleanFilter(method='filter_user_relation')
+    is_in_shopping_cart = filters.BooleanFilter(
+        method='filter_user_relation')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Популярные'),),
+        method='filter_ordering',
     )
 
     class Meta:
         model = Recipe
-        fields = ('tags',)
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
 
+    def filter_queryset(self, queryset):
+        data = self.form.cleaned_data
+        if data.get('ordering') and (data.get('search') or '').strip():
+            raise ValidationError({'ordering': [
+                'Результаты поиска упорядочены по релевантности; '
+                'ordering с search не сочетается.']})
+        return super().filter_queryset(queryset)
 
-class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    def filter_tags(self, queryset, name, tags):
+        if not tags:
+            return queryset
+        return queryset.with_any_tag(tags)
 
-    class Meta:
-        model = Ingredient
-        fields = ('name', )
+    def filter_user_relation(self, queryset, name, value):
+        """Полусоединение EXISTS с избранным или списком покупок."""
+        user = self.request.user
+        if value is None:
+            return queryset
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        model = Favorite if name == 'is_favorited' else ShoppingCart
+        relation = Exists(model.objects.filter(user=user,
+                                               recipe=OuterRef('pk')))
+        return queryset.filter(relation if value else ~relation)
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск с сортировкой по релевантности."""
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Рецепты с активностью за последнее время по убыванию рейтинга.
+
+        Порядок совпадает с индексом таблицы рейтинга: первая страница
+        читается из индекса без сортировки.
+        """
+        return queryset.filter(popularity__score__gt=0).order_by(
+            '-popularity__score', '-popularity__recipe_id')
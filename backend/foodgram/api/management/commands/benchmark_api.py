@@ -0,0 +1,308 @@
+import base64
+import io
+import json
+import statistics
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, resolve
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes.management.commands.seed_benchmark_data import SEED_PASSWORD
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow, User
+
+API_PREFIX = '/api/'
+
+# Бюджеты на один запрос: число SQL-запросов при пустом кэше и медиана
+# времени в мс. Запросов не должно становиться больше с ростом данных.
+BUDGETS = {
+    'api-root': (1, 20),
+    'auth-login': (4, 300),
+    'auth-logout': (2, 50),
+    'users-list': (3, 100),
+    'users-create': (5, 300),
+    'users-detail': (2, 50),
+    'users-me': (2, 50),
+    'users-set-password': (3, 300),
+    'users-set-email': (2, 50),
+    'users-activation': (1, 50),
+    'users-resend-activation': (1, 50),
+    'users-reset-password': (2, 50),
+    'users-reset-password-confirm': (1, 50),
+    'users-reset-email': (2, 50),
+    'users-reset-email-confirm': (1, 50),
+    'users-subscriptions': (4, 150),
+    'users-subscribe': (12, 100),
+    'users-unsubscribe': (9, 50),
+    'tags-list': (2, 50),
+    'tags-detail': (2, 50),
+    'ingredients-search': (2, 50),
+    'ingredients-detail': (2, 50),
+    'recipes-list': (7, 150),
+    'recipes-list-filtered': (8, 150),
+    'recipes-list-cursor': (6, 150),
+    'recipes-search': (8, 150),
+    'recipes-popular': (7, 150),
+    'recipes-feed': (9, 150),
+    'recipes-detail': (5, 100),
+    'recipes-create': (24, 300),
+    'recipes-update': (27, 300),
+    'recipes-delete': (15, 100),
+    'recipes-favorite': (10, 100),
+    'recipes-unfavorite': (9, 50),
+    'recipes-shopping-cart': (8, 100),
+    'recipes-shopping-cart-remove': (9, 50),
+    'recipes-download-shopping-cart': (2, 100),
+}
+
+
+def png_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), '#00AA00').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def iter_routes(patterns, prefix=''):
+    """Все маршруты api.urls без вариантов с суффиксом формата."""
+    for pattern in patterns:
+        # Как и resolve().route: без '^' в начале регулярных выражений.
+        route = prefix + str(pattern.pattern).lstrip('^')
+        if hasattr(pattern, 'url_patterns'):
+            yield from iter_routes(pattern.url_patterns, route)
+        elif '(?P<format>' not in route:
+            yield route
+
+
+class Command(BaseCommand):
+    help = ('Замер числа SQL-запросов, времени и размера ответа для '
+            'всех маршрутов API; ошибка при превышении бюджета')
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed-data", action="store_true",
+                            help="Сгенерировать данные seed_benchmark_data "
+                                 "на время замера")
+        parser.add_argument("--time-factor", type=float, default=1.0,
+                            help="Множитель бюджетов времени")
+        parser.add_argument("--json", type=str,
+                            help="Файл для сохранения результатов")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            MEDIA_ROOT=media_root,
+            RECIPE_IMAGE_ASYNC=True,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ), transaction.atomic():
+            if options['seed_data']:
+                call_command('seed_benchmark_data', stdout=io.StringIO())
+            results = self.run_cases(options['repeat'])
+            transaction.set_rollback(True)
+        cache.clear()
+        self.check_coverage(results)
+        failures = self.report(results, options['time_factor'])
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if failures:
+            raise CommandError(
+                'Превышены бюджеты: ' + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены.'))
+
+    def fixtures(self):
+        user = User.objects.filter(
+            recipes__isnull=False,
+            follower__isnull=False,
+            favorites__isnull=False,
+            sh_cart__isnull=False,
+        ).order_by('pk').first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замера: выполните seed_benchmark_data '
+                'или запустите команду с --seed-data.')
+        author = User.objects.filter(recipes__isnull=False).exclude(
+            pk=user.pk).exclude(following__user=user).order_by('pk').first()
+        recipe = Recipe.objects.exclude(author=user).exclude(
+            favorites__user=user).exclude(sh_cart__user=user).first()
+        return {
+            'user': user,
+            'author': author.pk,
+            'followed': Follow.objects.filter(
+                user=user).values_list('author_id', flat=True).first(),
+            'recipe': recipe.pk,
+            'own_recipe': user.recipes.values_list('pk', flat=True).first(),
+            'favorite': Favorite.objects.filter(
+                user=user).values_list('recipe_id', flat=True).first(),
+            'cart': ShoppingCart.objects.filter(
+                user=user).values_list('recipe_id', flat=True).first(),
+            'tags': list(Tag.objects.values_list('pk', 'slug')[:2]),
+            'ingredient': Ingredient.objects.values_list(
+                'pk', 'name').first(),
+        }
+
+    def cases(self, data):
+        """(имя, метод, путь, тело, ожидаемый статус)."""
+        image = png_base64()
+        (tag_id, tag_slug), *_ = data['tags']
+        ingredient_id, ingredient_name = data['ingredient']
+        recipe_body = {
+            'ingredients': [{'id': ingredient_id, 'amount': 10}],
+            'tags': [tag_id], 'image': image, 'name': 'Замер',
+            'text': 'Описание', 'cooking_time': 10,
+        }
+        tag_query = '&'.join(f'tags={slug}' for _, slug in data['tags'])
+        return [
+            ('api-root', 'get', '', None, 200),
+            ('auth-login', 'post', 'auth/token/login/',
+             {'email': data['user'].email, 'password': SEED_PASSWORD}, 200),
+            ('auth-logout', 'post', 'auth/token/logout/', None, 204),
+            ('users-list', 'get', 'users/', None, 200),
+            ('users-create', 'post', 'users/', {
+                'email': 'benchmark-new@example.com',
+                'username': 'benchmark-new', 'first_name': 'Имя',
+                'last_name': 'Фамилия', 'password': 'Sup3r-secret-pass',
+            }, 201),
+            ('users-detail', 'get', f"users/{data['author']}/", None, 200),
+            ('users-me', 'get', 'users/me/', None, 200),
+            ('users-set-password', 'post', 'users/set_password/', {
+                'current_password': SEED_PASSWORD,
+                'new_password': 'An0ther-secret-pass',
+            }, 204),
+            ('users-set-email', 'post', 'users/set_email/', {}, 400),
+            ('users-activation', 'post', 'users/activation/', {}, 400),
+            ('users-resend-activation', 'post', 'users/resend_activation/',
+             {}, 400),
+            ('users-reset-password', 'post', 'users/reset_password/',
+             {'email': 'nobody@example.com'}, 204),
+            ('users-reset-password-confirm', 'post',
+             'users/reset_password_confirm/', {}, 400),
+            ('users-reset-email', 'post', 'users/reset_email/',
+             {'email': 'nobody@example.com'}, 204),
+            ('users-reset-email-confirm', 'post',
+             'users/reset_email_confirm/', {}, 400),
+            ('users-subscriptions', 'get',
+             'users/subscriptions/?recipes_limit=3', None, 200),
+            ('users-subscribe', 'post',
+             f"users/{data['author']}/subscribe/", None, 201),
+            ('users-unsubscribe', 'delete',
+             f"users/{data['followed']}/subscribe/", None, 204),
+            ('tags-list', 'get', 'tags/', None, 200),
+            ('tags-detail', 'get', f'tags/{tag_id}/', None, 200),
+            ('ingredients-search', 'get',
+             f'ingredients/?name={ingredient_name[:3]}', None, 200),
+            ('ingredients-detail', 'get', f'ingredients/{ingredient_id}/',
+             None, 200),
+            ('recipes-list', 'get', 'recipes/', None, 200),
+            ('recipes-list-filtered', 'get',
+             f'recipes/?{tag_query}&is_favorited=0', None, 200),
+            ('recipes-list-cursor', 'get', 'recipes/?pagination=cursor',
+             None, 200),
+            ('recipes-search', 'get', f'recipes/?search=рецепт&{tag_query}',
+             None, 200),
+            ('recipes-popular', 'get', 'recipes/?ordering=popular', None,
+             200),
+            ('recipes-feed', 'get', 'recipes/feed/', None, 200),
+            ('recipes-detail', 'get', f"recipes/{data['recipe']}/",
+             None, 200),
+            ('recipes-create', 'post', 'recipes/', recipe_body, 201),
+            ('recipes-update', 'patch', f"recipes/{data['own_recipe']}/",
+             recipe_body, 200),
+            ('recipes-delete', 'delete', f"recipes/{data['own_recipe']}/",
+             None, 204),
+            ('recipes-favorite', 'post',
+             f"recipes/{data['recipe']}/favorite/", None, 201),
+            ('recipes-unfavorite', 'delete',
+             f"recipes/{data['favorite']}/favorite/", None, 204),
+            ('recipes-shopping-cart', 'post',
+             f"recipes/{data['recipe']}/shopping_cart/", None, 201),
+            ('recipes-shopping-cart-remove', 'delete',
+             f"recipes/{data['cart']}/shopping_cart/", None, 204),
+            ('recipes-download-shopping-cart', 'get',
+             'recipes/download_shopping_cart/', None, 200),
+        ]
+
+    def run_cases(self, repeat):
+        data = self.fixtures()
+        token, _ = Token.objects.get_or_create(user=data['user'])
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}',
+                        raise_request_exception=False)
+        results = []
+        for name, method, path, body, expected in self.cases(data):
+            path = API_PREFIX + path
+            # Первый прогон - с пустым кэшем: бюджет запросов считается
+            # по нему, остальные показывают работу с прогретым кэшем.
+            cache.clear()
+            timings, queries = [], []
+            for _ in range(repeat):
+                # Точка сохранения создаётся до начала подсчёта запросов.
+                with transaction.atomic(), CaptureQueriesContext(
+                        connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(
+                        path, body, content_type='application/json')
+                    content = b''.join(response.streaming_content) if (
+                        response.streaming) else response.content
+                    timings.append((time.perf_counter() - started) * 1000)
+                    transaction.set_rollback(True)
+                queries.append(len(captured))
+                if response.status_code != expected:
+                    break
+            if method != 'get':
+                cache.clear()
+            results.append({
+                'name': name,
+                'method': method.upper(),
+                'path': path,
+                'route': resolve(path.split('?')[0]).route,
+                'status': response.status_code,
+                'expected': expected,
+                'queries': queries[0],
+                'warm_queries': queries[-1],
+                'ms': round(statistics.median(timings), 2),
+                'bytes': len(content),
+            })
+        return results
+
+    def check_coverage(self, results):
+        routes = set(iter_routes(
+            get_resolver('api.urls').url_patterns, API_PREFIX[1:]))
+        missing = routes - {result['route'] for result in results}
+        for route in sorted(missing):
+            self.stdout.write(self.style.WARNING(
+                f'Маршрут не покрыт замером: {route}'))
+
+    def report(self, results, time_factor):
+        failures = []
+        self.stdout.write(
+            f"{'Замер':<32}{'Статус':>7}{'SQL':>6}{'SQL*':>6}"
+            f"{'мс':>9}{'байт':>9}")
+        for result in results:
+            max_queries, max_ms = BUDGETS.get(result['name'], (None, None))
+            problems = []
+            if result['status'] != result['expected']:
+                problems.append(f"статус {result['status']}, "
+                                f"ожидался {result['expected']}")
+            if max_queries is not None and result['queries'] > max_queries:
+                problems.append(f'SQL > {max_queries}')
+            if max_ms is not None and result['ms'] > max_ms * time_factor:
+                problems.append(f'время > {max_ms * time_factor:.0f} мс')
+            line = (f"{result['name']:<32}{result['status']:>7}"
+                    f"{result['queries']:>6}{result['warm_queries']:>6}"
+                    f"{result['ms']:>9.1f}{result['bytes']:>9}")
+            if problems:
+                failures.append(result['name'])
+                self.stdout.write(self.style.ERROR(
+                    f"{line}  {'; '.join(problems)}"))
+            else:
+                self.stdout.write(line)
+        self.stdout.write('SQL* - запросов при прогретом кэше.')
+        return failures
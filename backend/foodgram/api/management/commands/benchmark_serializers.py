@@ -0,0 +1,113 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.representations import RECIPE_ROW_FIELDS, recipe_representations
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe
+from users.models import User
+
+# Кэш общей части рецептов отключён: оба пути строят ответ из базы.
+DUMMY_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def make_request(user):
+    request = Request(RequestFactory().get('/api/recipes/'))
+    request.user = user
+    return request
+
+
+class Command(BaseCommand):
+    help = ('Сверка представлений рецептов без ModelSerializer с '
+            'RecipeSerializer и замер скорости сериализации')
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=500)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--user",
+            type=int,
+            help="id пользователя для флагов избранного, списка покупок "
+                 "и подписки; по умолчанию - пользователь с подписками "
+                 "и избранным",
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        pks = list(Recipe.objects.values_list(
+            'pk', flat=True)[:options['recipes']])
+        if not pks:
+            raise CommandError('Нет рецептов: выполните '
+                               'seed_benchmark_data.')
+        with override_settings(CACHES=DUMMY_CACHE,
+                               ALLOWED_HOSTS=['testserver']):
+            for current in (user, AnonymousUser()):
+                self.check_parity(current, pks)
+            self.stdout.write(f'{"Путь":<20}{"мс":>10}{"рецептов/с":>14}'
+                              f'{"SQL":>6}')
+            for name, render in (('RecipeSerializer', self.reference),
+                                 ('values()', self.fast)):
+                duration, queries = self.measure(
+                    render, user, pks, options['repeat'])
+                self.stdout.write(
+                    f'{name:<20}{duration * 1000:>10.1f}'
+                    f'{len(pks) / duration:>14.0f}{queries:>6}')
+
+    def get_user(self, pk):
+        if pk is not None:
+            user = User.objects.filter(pk=pk).first()
+        else:
+            user = User.objects.filter(
+                follower__isnull=False, favorites__isnull=False,
+            ).order_by('pk').first() or User.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        return user
+
+    def reference(self, user, pks):
+        request = make_request(user)
+        recipes = Recipe.objects.with_user_flags(user).filter(pk__in=pks)
+        return RecipeSerializer(recipes, many=True,
+                                context={'request': request}).data
+
+    def fast(self, user, pks):
+        request = make_request(user)
+        rows = Recipe.objects.with_user_flags(user).filter(
+            pk__in=pks).values(*RECIPE_ROW_FIELDS)
+        return recipe_representations(rows, request)
+
+    def check_parity(self, user, pks):
+        """JSON обоих путей должен совпадать побайтно, включая порядок."""
+        renderer = JSONRenderer()
+        expected = self.reference(user, pks)
+        actual = self.fast(user, pks)
+        if len(expected) != len(actual):
+            raise CommandError(f'Количество рецептов: {len(expected)} '
+                               f'и {len(actual)}.')
+        for left, right in zip(expected, actual):
+            if renderer.render(left) != renderer.render(right):
+                raise CommandError(
+                    f'Расхождение для рецепта {left["id"]}:\n'
+                    f'{renderer.render(left).decode()}\n'
+                    f'{renderer.render(right).decode()}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{user}: ответы совпадают ({len(expected)} рецептов).'))
+
+    def measure(self, render, user, pks, repeat):
+        """Лучшее время из repeat прогонов и число SQL-запросов."""
+        best = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                render(user, pks)
+                duration = time.perf_counter() - started
+            best = duration if best is None else min(best, duration)
+        return best, len(queries)
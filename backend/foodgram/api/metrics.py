@@ -0,0 +1,197 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+METRICS = {
+    'foodgram_requests_total': (
+        'counter', 'Количество запросов по view, методу и статусу'),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Время обработки запроса'),
+    'foodgram_response_size_bytes': (
+        'histogram', 'Размер тела ответа (без потоковых ответов)'),
+    'foodgram_db_queries_total': (
+        'counter', 'Количество SQL-запросов'),
+    'foodgram_db_duration_seconds_total': (
+        'counter', 'Суммарное время SQL-запросов'),
+}
+
+HEADER = struct.Struct('<I4x')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+
+
+def _padded(length):
+    """Длина записи ключа, выровненная так, чтобы значение шло с кратного 8."""
+    return (KEY_LENGTH.size + length + 7) // 8 * 8
+
+
+def read_entries(data):
+    """Пары (ключ, значение, смещение значения) из содержимого файла."""
+    used = HEADER.unpack_from(data, 0)[0] or HEADER.size
+    position = HEADER.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        key = bytes(
+            data[position + KEY_LENGTH.size:position + KEY_LENGTH.size
+                 + length]).decode()
+        value_position = position + _padded(length)
+        yield key, VALUE.unpack_from(data, value_position)[0], value_position
+        position = value_position + VALUE.size
+
+
+class MmapDict:
+    """Значения float64 по строковым ключам в файле, отображённом в память.
+
+    Каждый процесс пишет только в свой файл, поэтому блокировки между
+    процессами не нужны; читатели складывают значения всех файлов.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_SIZE)
+        self._map(os.fstat(self._file.fileno()).st_size)
+        self._positions = {}
+        self._used = HEADER.size
+        for key, _, position in read_entries(self._mmap):
+            self._positions[key] = position
+            self._used = position + VALUE.size
+
+    def _map(self, size):
+        self._capacity = size
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+    def _append(self, key):
+        encoded = key.encode()
+        value_position = self._used + _padded(len(encoded))
+        end = value_position + VALUE.size
+        if end > self._capacity:
+            self._mmap.close()
+            self._file.truncate(max(self._capacity * 2, end))
+            self._map(max(self._capacity * 2, end))
+        KEY_LENGTH.pack_into(self._mmap, self._used, len(encoded))
+        self._mmap[self._used + KEY_LENGTH.size:
+                   self._used + KEY_LENGTH.size + len(encoded)] = encoded
+        VALUE.pack_into(self._mmap, value_position, 0.0)
+        # Заголовок пишется последним: читатель не увидит запись без
+        # значения.
+        HEADER.pack_into(self._mmap, 0, end)
+        self._used = end
+        self._positions[key] = value_position
+        return value_position
+
+    def increment(self, key, amount=1.0):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = VALUE.unpack_from(self._mmap, position)[0]
+            VALUE.pack_into(self._mmap, position, value + amount)
+
+
+_store = None
+_store_pid = None
+
+
+def get_store():
+    """Файл текущего процесса; после fork воркера gunicorn - новый."""
+    global _store, _store_pid
+    if _store_pid != os.getpid():
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        _store = MmapDict(
+            os.path.join(settings.METRICS_DIR, f'metrics_{os.getpid()}.db'))
+        _store_pid = os.getpid()
+    return _store
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def _observe(store, name, labels, value, buckets):
+    # Пустые корзины тоже создаются: гистограмма выводится целиком.
+    for bound in buckets:
+        store.increment(_key(f'{name}_bucket', {**labels, 'le': bound}),
+                        1 if value <= bound else 0)
+    store.increment(_key(f'{name}_bucket', {**labels, 'le': '+Inf'}))
+    store.increment(_key(f'{name}_sum', labels), value)
+    store.increment(_key(f'{name}_count', labels))
+
+
+def observe_request(view, method, status, duration, queries, db_duration,
+                    size=None):
+    store = get_store()
+    labels = {'view': view, 'method': method}
+    store.increment(_key('foodgram_requests_total',
+                         {**labels, 'status': str(status)}))
+    _observe(store, 'foodgram_request_duration_seconds', labels, duration,
+             LATENCY_BUCKETS)
+    if size is not None:
+        _observe(store, 'foodgram_response_size_bytes', labels, size,
+                 SIZE_BUCKETS)
+    store.increment(_key('foodgram_db_queries_total', labels), queries)
+    store.increment(_key('foodgram_db_duration_seconds_total', labels),
+                    db_duration)
+
+
+def collect():
+    """Сумма значений по файлам всех процессов."""
+    values = defaultdict(float)
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < HEADER.size:
+            continue
+        for key, value, _ in read_entries(data):
+            values[key] += value
+    return values
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _sort_key(sample):
+    name, labels = sample
+    bound = dict(labels).get('le')
+    return ([(label, value) for label, value in labels if label != 'le'],
+            name, float(bound) if bound is not None else 0)
+
+
+def render_metrics():
+    """Метрики в текстовом формате Prometheus."""
+    families = defaultdict(dict)
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        families[_family(name)][(name, tuple(map(tuple, labels)))] = value
+    lines = []
+    for family in sorted(families):
+        kind, description = METRICS.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, labels in sorted(families[family], key=_sort_key):
+            label_text = ','.join(
+                f'{label}="{_escape(value)}"' for label, value in labels)
+            lines.append(f'{name}{{{label_text}}} '
+                         f'{families[family][(name, labels)]!r}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,127 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Обёртка execute: число, время и форма SQL-запросов одного запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            # Параметры не входят в SQL: одинаковые запросы с разными id
+            # дают одну форму.
+            self.shapes[sql] += 1
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.most_common()
+                if count >= threshold]
+
+
+class QueryInstrumentationMiddleware:
+    """Заголовок Server-Timing, журнал медленных запросов и вероятных N+1.
+
+    Включается настройкой SQL_INSTRUMENTATION. Запросы, выполненные при
+    отдаче потокового ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request._render_time = 0.0
+        started = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.duration * 1000:.1f};'
+            f'desc="{stats.count} queries"',
+            f'render;dur={request._render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        self.log(request, response, stats, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF формирует JSON при render() после выхода из view.
+        started = time.perf_counter()
+
+        def render_finished(response):
+            request._render_time += time.perf_counter() - started
+
+        response.add_post_render_callback(render_finished)
+        return response
+
+    def log(self, request, response, stats, total):
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(
+                'Медленный запрос %s %s: %d, %.1f мс, SQL: %d за %.1f мс',
+                request.method, request.get_full_path(),
+                response.status_code, total * 1000,
+                stats.count, stats.duration * 1000)
+        for sql, count in stats.repeated(settings.N_PLUS_ONE_THRESHOLD):
+            logger.warning(
+                'Вероятный N+1 в %s %s: запрос выполнен %d раз: %s',
+                request.method, request.path, count, sql)
+
+
+def view_name(request):
+    """Класс view и действие, например RecipeViewSet.download_shopping_cart."""
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'cls', None) or getattr(
+        match.func, 'view_class', None)
+    if view is None:
+        return match.view_name or match.func.__name__
+    action = getattr(match.func, 'actions', {}).get(request.method.lower())
+    return f'{view.__name__}.{action}' if action else view.__name__
+
+
+class MetricsMiddleware:
+    """Время, статус, размер ответа и SQL-запросы по каждому view.
+
+    Включается настройкой METRICS_ENABLED; данные отдаются по /metrics/.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        observe_request(
+            view_name(request),
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            stats.count,
+            stats.duration,
+            None if response.streaming else len(response.content),
+        )
+        return response
@@ -0,0 +1,84 @@
+import base64
+from collections import OrderedDict
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.feed import feed_keys
+
+
+# Наибольший размер страницы, который можно запросить параметром limit.
+MAX_PAGE_SIZE = 100
+
+
+class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с размером страницы из параметра limit."""
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Пагинация по курсору: без COUNT(*) и OFFSET, стабильна при вставках."""
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class FeedPagination(BasePagination):
+    """Пагинация ленты по ключу (pub_date, id) последнего рецепта страницы.
+
+    Лента собирается из двух источников, поэтому курсор хранит сам ключ,
+    а не позицию в одной выборке.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        limit = request.query_params.get(self.page_size_query_param, '')
+        if limit.isdigit() and int(limit) > 0:
+            return min(int(limit), self.max_page_size)
+        return api_settings.PAGE_SIZE
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            pub_date, pk = base64.urlsafe_b64decode(
+                cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, key):
+        pub_date, pk = key
+        return base64.urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{pk}'.encode()).decode()
+
+    def paginate_feed(self, request, user):
+        """Id рецептов страницы ленты в порядке вывода."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        keys = feed_keys(user, self.decode_cursor(request), page_size + 1)
+        self.next_key = keys[page_size - 1] if len(keys) > page_size else None
+        return [pk for _, pk in keys[:page_size]]
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,102 @@
+"""Представления рецептов для чтения без ModelSerializer.
+
+Форма JSON совпадает с RecipeSerializer; совпадение проверяют команда
+benchmark_serializers и api/tests.py. Запись и просмотр одного рецепта
+идут через сериализаторы.
+"""
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from recipes.models import Recipe, RecipeIngredient
+from users.serializers import get_followed_author_ids
+
+from .cache import get_recipe_payloads, set_recipe_payloads
+
+# Поля строк выборки, по которым строится ответ; pub_date нужен пагинации
+# по курсору.
+RECIPE_ROW_FIELDS = ('id', 'author_id', 'pub_date', 'is_favorited',
+                     'is_in_shopping_cart')
+RECIPE_FIELDS = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
+                 'name', 'image', 'image_thumbnail', 'image_detail',
+                 'image_status', 'text', 'is_in_shopping_cart',
+                 'cooking_time')
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_detail')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+SHARED_FIELDS = ('id', 'name', 'image', 'image_thumbnail', 'image_detail',
+                 'image_status', 'text', 'cooking_time')
+
+
+def image_url(name):
+    return default_storage.url(name) if name else None
+
+
+def build_recipe_payloads(pks):
+    """Общая для всех пользователей часть рецептов из values_list.
+
+    Теги идут по id, ингредиенты - в порядке добавления, как в
+    RecipeSerializer. Результат кэшируется по id рецепта (api/cache.py).
+    """
+    pks = list(pks)
+    tags = defaultdict(list)
+    for recipe_id, *tag in Recipe.tags.through.objects.filter(
+            recipe_id__in=pks).order_by('tag_id').values_list(
+            'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'):
+        tags[recipe_id].append(dict(zip(TAG_FIELDS, tag)))
+    ingredients = defaultdict(list)
+    for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+            recipe_id__in=pks).order_by('pk').values_list(
+            'recipe_id', 'ingredient__id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'):
+        ingredients[recipe_id].append(dict(zip(INGREDIENT_FIELDS,
+                                               ingredient)))
+    payloads = {}
+    for row in Recipe.objects.filter(pk__in=pks).order_by().values_list(
+            *SHARED_FIELDS, *(f'author__{field}' for field in AUTHOR_FIELDS)):
+        recipe = dict(zip(SHARED_FIELDS, row))
+        for field in IMAGE_FIELDS:
+            recipe[field] = image_url(recipe[field])
+        author = dict(zip(AUTHOR_FIELDS, row[len(SHARED_FIELDS):]))
+        payloads[recipe['id']] = {
+            'id': recipe['id'],
+            'tags': tags[recipe['id']],
+            'author': author,
+            'ingredients': ingredients[recipe['id']],
+            **{field: recipe[field] for field in SHARED_FIELDS[1:]},
+        }
+    return payloads
+
+
+def personalize(shared, row, followed, request):
+    recipe = dict(
+        shared,
+        author=dict(shared['author'],
+                    is_subscribed=row['author_id'] in followed),
+        is_favorited=row['is_favorited'],
+        is_in_shopping_cart=row['is_in_shopping_cart'],
+    )
+    if request is not None:
+        for field in IMAGE_FIELDS:
+            if recipe[field]:
+                recipe[field] = request.build_absolute_uri(recipe[field])
+    return {field: recipe[field] for field in RECIPE_FIELDS}
+
+
+def recipe_representations(rows, request):
+    """Рецепты по строкам values(*RECIPE_ROW_FIELDS) в порядке строк.
+
+    Общая часть берётся из кэша или строится запросами values_list,
+    флаги пользователя подставляются поверх неё.
+    """
+    rows = list(rows)
+    payloads = get_recipe_payloads(row['id'] for row in rows)
+    missing = [row['id'] for row in rows if row['id'] not in payloads]
+    if missing:
+        fresh = build_recipe_payloads(missing)
+        set_recipe_payloads(fresh)
+        payloads.update(fresh)
+    followed = get_followed_author_ids(request)
+    return [personalize(payloads[row['id']], row, followed, request)
+            for row in rows if row['id'] in payloads]
@@ -1,9 +1,13 @@
 import base64
 
 from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.images import validate_recipe_image
+from recipes.jobs import schedule_image_processing
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             Tag,
                             ShoppingCart)
@@ -11,6 +15,8 @@ from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
 from users.models import User
 from users.serializers import UserGetSerializer
 
+from .cache import invalidate_recipe_payloads
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
@@ -43,10 +49,34 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с краткой информацией о рецепте."""
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumbnail', 'image_detail',
+                  'cooking_time')
+
+
+def recipe_prefetches():
+    """Теги по id, ингредиенты в порядке добавления (как в representations)."""
+    return (
+        Prefetch('recipe_ingredients',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient').order_by('pk')),
+        Prefetch('tags', queryset=Tag.objects.order_by('pk')),
+    )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, models.Manager)
+                       else data)
+        prefetch_related_objects(recipes, *recipe_prefetches())
+        return super().to_representation(recipes)
 
 
 class RecipeSerializer(RecipeSmallSerializer):
+    """Рецепт целиком через поля DRF, без кэша.
+
+    Ответ записи, просмотра рецепта и эталон для списков, которые
+    собираются в api/representations.py.
+    """
     tags = TagSerializer(many=True, read_only=True,)
     is_favorited = serializers.SerializerMethodField()
     author = UserGetSerializer(read_only=True,)
@@ -58,87 +88,123 @@ class RecipeSerializer(RecipeSmallSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'name', 'image', 'text',
-                  'is_in_shopping_cart',
+                  'name', 'image', 'image_thumbnail', 'image_detail',
+                  'image_status', 'text', 'is_in_shopping_cart',
                   'cooking_time')
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        # Для рецептов из списка связи уже загружены: запросов нет.
+        prefetch_related_objects([instance], *recipe_prefetches())
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
         """Статус - рецепт в избранном или нет."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user_id = self.context.get('request').user.id
         return Favorite.objects.filter(
             user=user_id, recipe=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
-        """Статус - рецепт в избранном или нет."""
+        """Статус - рецепт в списке покупок или нет."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user_id = self.context.get('request').user.id
         return ShoppingCart.objects.filter(
             user=user_id, recipe=obj.id).exists()
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
-    author = UserGetSerializer(read_only=True)
+class RecipeWriteSerializer(serializers.ModelSerializer):
+    """Общая проверка ингредиентов и тегов при записи рецепта.
+
+    Все id проверяются одним запросом in_bulk на модель.
+    """
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
-    image = Base64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
+
+    def validate_ingredients(self, value):
+        ids = [item['id'] for item in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться.')
+        ingredients = Ingredient.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in ingredients]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {missing}')
+        return [{'ingredient': ingredients[item['id']],
+                 'amount': item['amount']} for item in value]
+
+    def validate_tags(self, value):
+        ids = list(dict.fromkeys(value))
+        tags = Tag.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in tags]
+        if missing:
+            raise serializers.ValidationError(f'Теги не найдены: {missing}')
+        return [tags[pk] for pk in ids]
+
+    def to_representation(self, instance):
+        serializer = RecipeSerializer(
+            instance,
+            context={'request': self.context.get('request')}
+        )
+        return serializer.data
+
+
+class RecipeCreateSerializer(RecipeWriteSerializer):
+    author = UserGetSerializer(read_only=True)
+    image = Base64ImageField(validators=[validate_recipe_image])
 
     class Meta:
         model = Recipe
         fields = ("author", "ingredients", "tags", "name", "image", "text",
                   "cooking_time")
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags')
         instance = super().create(validated_data)
-        recipe_ingredients = []
-        for ingredient_data in ingredients:
-            recipe_ingredients.append(
-                RecipeIngredient(
-                    recipe=instance,
-                    ingredient=ingredient_data['ingredient'],
-                    amount=ingredient_data['amount']
-                )
+        instance.tags.add(*tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=instance,
+                ingredient=ingredient_data['ingredient'],
+                amount=ingredient_data['amount']
             )
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        return instance
-
-    def to_representation(self, instance):
-        serializer = RecipeSerializer(
-            instance,
-            context={'request': self.context.get('request')}
+            for ingredient_data in ingredients
         )
-        return serializer.data
+        schedule_image_processing(instance)
+        transaction.on_commit(
+            lambda: invalidate_recipe_payloads([instance.pk]))
+        return instance
 
 
-class RecipePartialUpdateSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-        required=False,
-    )
+class RecipePartialUpdateSerializer(RecipeWriteSerializer):
+    tags = serializers.ListField(child=serializers.IntegerField(),
+                                 required=False)
     ingredients = RecipeIngredientCreateSerializer(many=True, required=False)
-    image = Base64ImageField(required=True)
+    image = Base64ImageField(required=True,
+                             validators=[validate_recipe_image])
 
     class Meta:
         model = Recipe
         fields = ('name', 'text', 'image', 'cooking_time', 'tags',
                   'ingredients')
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('ingredients', [])
-        tags = validated_data.pop('tags', [])
+        ingredients_data = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
 
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
@@ -147,31 +213,44 @@ class RecipePartialUpdateSerializer(serializers.ModelSerializer):
         instance.image = validated_data.get('image', instance.image)
 
         instance.save()
-
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        recipe_ingredients = []
-        for ingredient_data in ingredients_data:
-            ingredient_name = ingredient_data.get('ingredient')
-            ingredient = Ingredient.objects.get(name=ingredient_name)
-            if ingredient:
-                recipe_ingredients.append(
-                    RecipeIngredient(
-                        recipe=instance,
-                        ingredient=ingredient,
-                        amount=ingredient_data['amount']
-                    )
-                )
-
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        instance.tags.set(tags)
+        if 'image' in validated_data:
+            schedule_image_processing(instance)
+        if ingredients_data is not None:
+            self.update_ingredients(instance, ingredients_data)
+        if tags is not None:
+            instance.tags.set(tags)
+        transaction.on_commit(
+            lambda: invalidate_recipe_payloads([instance.pk]))
         return instance
 
-    def to_representation(self, instance):
-        serializer = RecipeSerializer(
-            instance,
-            context={'request': self.context.get('request')}
+    def update_ingredients(self, instance, ingredients_data):
+        """Применяет только разницу с текущими ингредиентами рецепта."""
+        amounts = {
+            ingredient_data['ingredient'].pk: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=instance)
+        }
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=instance, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
         )
-        return serializer.data
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=instance, ingredient_id__in=removed).delete()
 
 
 class IngredientGetSerializer(serializers.ModelSerializer):
@@ -208,10 +287,9 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
 
 class SubscriptionsSerializer(UserGetSerializer):
     recipes = RecipeSmallSerializer(many=True, read_only=True)
-    recipes_count = serializers.IntegerField(source='recipes.count',
-                                             read_only=True)
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count',)
+        read_only_fields = ('recipes_count',)
@@ -0,0 +1,59 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from .cache import invalidate_recipe_payloads, invalidate_response_cache
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_reference_cache(sender, **kwargs):
+    invalidate_response_cache(sender)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipe_payloads([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    invalidate_recipe_payloads([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_recipe_payloads([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_recipe_payloads(
+            Recipe.objects.filter(tags=instance).values_list('pk', flat=True)
+        )
+    elif action in ('post_add', 'post_remove'):
+        invalidate_recipe_payloads(pk_set)
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def invalidate_tag_recipes(sender, instance, **kwargs):
+    invalidate_recipe_payloads(
+        Recipe.objects.filter(tags=instance).values_list('pk', flat=True))
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, **kwargs):
+    invalidate_recipe_payloads(RecipeIngredient.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, update_fields=None,
+                              **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    invalidate_recipe_payloads(
+        instance.recipes.values_list('pk', flat=True))
@@ -0,0 +1,197 @@
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.representations import RECIPE_ROW_FIELDS, recipe_representations
+from api.serializers import (RecipeCreateSerializer,
+                             RecipePartialUpdateSerializer, RecipeSerializer)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow
+from recipes.tests import create_recipe, create_user
+
+
+class CachedResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.client = APIClient()
+
+    def test_cache_hit_keeps_headers(self):
+        for url in ('/api/tags/', '/api/ingredients/?name=со'):
+            with self.subTest(url=url):
+                miss = self.client.get(url)
+                hit = self.client.get(url)
+                self.assertEqual(miss.content, hit.content)
+                self.assertEqual(sorted(miss.items()), sorted(hit.items()))
+                self.assertIn('Accept', hit['Vary'])
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Accept', response['Vary'])
+
+
+class UpdateIngredientsTests(TestCase):
+    def setUp(self):
+        self.recipe = create_recipe(create_user('author'), 1)
+        self.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(4)
+        ]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient,
+                             amount=10)
+            for ingredient in self.ingredients[:3])
+
+    def rows(self):
+        return {row.ingredient_id: (row.pk, row.amount)
+                for row in RecipeIngredient.objects.filter(
+                    recipe=self.recipe)}
+
+    def test_applies_only_the_difference(self):
+        first, second, third, fourth = self.ingredients
+        before = self.rows()
+        RecipePartialUpdateSerializer().update_ingredients(self.recipe, [
+            {'ingredient': first, 'amount': 10},
+            {'ingredient': second, 'amount': 25},
+            {'ingredient': fourth, 'amount': 5},
+        ])
+        after = self.rows()
+        self.assertEqual(set(after), {first.pk, second.pk, fourth.pk})
+        self.assertEqual(after[first.pk], before[first.pk])
+        self.assertEqual(after[second.pk], (before[second.pk][0], 25))
+        self.assertEqual(after[fourth.pk][1], 5)
+
+    def test_unchanged_ingredients_are_not_written(self):
+        before = self.rows()
+        with self.assertNumQueries(1):
+            RecipePartialUpdateSerializer().update_ingredients(
+                self.recipe,
+                [{'ingredient': ingredient, 'amount': 10}
+                 for ingredient in self.ingredients[:3]])
+        self.assertEqual(self.rows(), before)
+
+
+class RecipeWriteValidationTests(TestCase):
+    def setUp(self):
+        self.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(2)
+        ]
+        self.tag = Tag.objects.create(name='Обед', color='#49B64E',
+                                      slug='lunch')
+
+    def errors(self, ingredients, tags):
+        serializer = RecipeCreateSerializer(data={
+            'ingredients': ingredients, 'tags': tags, 'name': 'Рецепт',
+            'text': 'Описание', 'cooking_time': 5,
+        })
+        self.assertFalse(serializer.is_valid())
+        return serializer.errors
+
+    def test_valid_ids_are_loaded_in_one_query(self):
+        first, second = self.ingredients
+        with self.assertNumQueries(1):
+            validated = RecipeCreateSerializer().validate_ingredients([
+                {'id': second.pk, 'amount': 2},
+                {'id': first.pk, 'amount': 1},
+            ])
+        self.assertEqual(validated, [
+            {'ingredient': second, 'amount': 2},
+            {'ingredient': first, 'amount': 1},
+        ])
+
+    def test_duplicate_ingredients_rejected(self):
+        pk = self.ingredients[0].pk
+        errors = self.errors(
+            [{'id': pk, 'amount': 1}, {'id': pk, 'amount': 2}],
+            [self.tag.pk])
+        self.assertEqual(errors['ingredients'],
+                         ['Ингредиенты не должны повторяться.'])
+
+    def test_missing_ingredients_and_tags_rejected(self):
+        errors = self.errors(
+            [{'id': self.ingredients[0].pk, 'amount': 1},
+             {'id': 0, 'amount': 1}],
+            [self.tag.pk, 0])
+        self.assertEqual(errors['ingredients'],
+                         ['Ингредиенты не найдены: [0]'])
+        self.assertEqual(errors['tags'], ['Теги не найдены: [0]'])
+
+
+class RecipeRepresentationTests(TestCase):
+    """Списки из api/representations.py совпадают с RecipeSerializer."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        full = Recipe.objects.create(
+            author=self.author, name='Борщ', text='Свёкла', cooking_time=90,
+            image='recipes/borsch.png',
+            image_thumbnail='recipes/derivatives/borsch_thumbnail.webp',
+            image_detail='recipes/derivatives/borsch_detail.webp')
+        tags = [Tag.objects.create(name=f'Тег {number}', color='#FFFFFF',
+                                   slug=f'tag-{number}')
+                for number in range(2)]
+        full.tags.add(tags[1], tags[0])
+        for number, amount in ((2, 300), (1, 50)):
+            RecipeIngredient.objects.create(
+                recipe=full, amount=amount,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {number}', measurement_unit='г'))
+        create_recipe(self.author, 2)
+        Favorite.objects.create(user=self.reader, recipe=full)
+        ShoppingCart.objects.create(user=self.reader, recipe=full)
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def request(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def render(self, user, fast):
+        recipes = Recipe.objects.with_user_flags(user)
+        if fast:
+            data = recipe_representations(
+                recipes.values(*RECIPE_ROW_FIELDS), self.request(user))
+        else:
+            data = RecipeSerializer(
+                recipes, many=True,
+                context={'request': self.request(user)}).data
+        return JSONRenderer().render(data)
+
+    def test_fast_path_matches_serializer(self):
+        for user in (self.reader, AnonymousUser()):
+            expected = self.render(user, fast=False)
+            # Второй проход берёт общую часть из кэша.
+            for attempt in range(2):
+                with self.subTest(user=str(user), attempt=attempt):
+                    self.assertEqual(self.render(user, fast=True), expected)
+
+    def test_reference_covers_flags_and_relations(self):
+        recipes = {recipe['name']: recipe for recipe in json.loads(
+            self.render(self.reader, fast=False))}
+        full, bare = recipes['Борщ'], recipes['Рецепт 2']
+        self.assertTrue(full['is_favorited'])
+        self.assertTrue(full['is_in_shopping_cart'])
+        self.assertTrue(full['author']['is_subscribed'])
+        self.assertEqual(full['image'],
+                         'http://testserver/media/recipes/borsch.png')
+        self.assertEqual([tag['slug'] for tag in full['tags']],
+                         ['tag-0', 'tag-1'])
+        self.assertEqual([item['amount'] for item in full['ingredients']],
+                         [300, 50])
+        self.assertEqual((bare['image'], bare['tags'], bare['ingredients']),
+                         (None, [], []))
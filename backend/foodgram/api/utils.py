@@ -0,0 +1,39 @@
+import csv
+import json
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_txt(ingredients):
+    for item in ingredients:
+        yield (f"{item['name']} - {item['amount']} "
+               f"{item['measurement_unit']}\n")
+
+
+def shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for item in ingredients:
+        yield writer.writerow(
+            (item['name'], item['amount'], item['measurement_unit']))
+
+
+def shopping_cart_json(ingredients):
+    yield '['
+    separator = ''
+    for item in ingredients:
+        yield separator + json.dumps(item, ensure_ascii=False)
+        separator = ','
+    yield ']\n'
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'json': (shopping_cart_json, 'application/json; charset=utf-8'),
+}
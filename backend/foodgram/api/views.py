@@ -1,4 +1,8 @@
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
@@ -10,24 +14,39 @@ from api.serializers import (FavoriteSerializer, IngredientGetSerializer,
                              RecipeCreateSerializer,
                              RecipePartialUpdateSerializer, RecipeSerializer,
                              RecipeSmallSerializer, TagSerializer)
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 
-from .filters import IngredientFilter, RecipeFilter
+from .cache import CachedResponseMixin
+from .filters import RecipeFilter
+from .metrics import render_metrics
+from .pagination import FeedPagination, RecipeCursorPagination
+from .representations import RECIPE_ROW_FIELDS, recipe_representations
+from .utils import SHOPPING_CART_FORMATS
 
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CachedResponseMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientGetSerializer
     pagination_class = None
-    filter_backends = (DjangoFilterBackend, )
-    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.search, request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        """Автодополнение по названию из индекса в памяти процесса."""
+        limit = request.query_params.get('limit', '')
+        limit = (min(max(int(limit), 1), settings.INGREDIENT_SEARCH_LIMIT)
+                 if limit.isdigit() else settings.INGREDIENT_SEARCH_LIMIT)
+        return Response(ingredient_index.search(
+            request.query_params.get('name', ''), limit))
 
 
 class RecipeViewSet(ModelViewSet):
@@ -38,9 +57,23 @@ class RecipeViewSet(ModelViewSet):
     filterset_class = RecipeFilter
 
     def get_queryset(self):
-        return Recipe.objects.prefetch_related(
-            'recipe_ingredients__ingredient', 'tags'
-        ).all()
+        return Recipe.objects.with_user_flags(self.request.user)
+
+    @property
+    def paginator(self):
+        """Пагинация по курсору включается параметром pagination=cursor.
+
+        Курсор упорядочивает по дате, поэтому при поиске (порядок по
+        релевантности) и сортировке по популярности остаётся постраничная
+        пагинация.
+        """
+        params = self.request.query_params
+        if (not hasattr(self, '_paginator')
+                and params.get('pagination') == 'cursor'
+                and not params.get('search')
+                and not params.get('ordering')):
+            self._paginator = RecipeCursorPagination()
+        return super().paginator
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -52,8 +85,19 @@ class RecipeViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        """Список строится из values() без ModelSerializer."""
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *RECIPE_ROW_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(recipe_representations(queryset, request))
+        return self.get_paginated_response(
+            recipe_representations(page, request))
+
     @action(methods=['get', 'post', 'delete'], detail=True,
             url_path='favorite', permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def favorites(self, request, pk=None):
         if request.method == 'POST':
             recipe = self.get_object()
@@ -91,10 +135,9 @@ class RecipeViewSet(ModelViewSet):
                                          partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        instance.tags.set(serializer.validated_data.get('tags',
-                                                        instance.tags.all()))
         return Response(serializer.data)
 
+    @transaction.atomic
     def add(self, model, user, pk, name):
         recipe = get_object_or_404(Recipe, pk=pk)
         relation = model.objects.filter(user=user, recipe=recipe)
@@ -106,6 +149,7 @@ class RecipeViewSet(ModelViewSet):
         serializer = RecipeSmallSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_relation(self, model, user, pk, name):
         recipe = get_object_or_404(Recipe, pk=pk)
         relation = model.objects.filter(user=user, recipe=recipe)
@@ -127,23 +171,46 @@ class RecipeViewSet(ModelViewSet):
         name = 'списка покупок'
         return self.delete_relation(ShoppingCart, user, pk, name)
 
+    @action(methods=['get'], detail=False,
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок пользователя, новые первыми."""
+        paginator = FeedPagination()
+        ids = paginator.paginate_feed(request, request.user)
+        rows = {row['id']: row for row in self.get_queryset().filter(
+            pk__in=ids).values(*RECIPE_ROW_FIELDS)}
+        return paginator.get_paginated_response(recipe_representations(
+            [rows[pk] for pk in ids if pk in rows], request))
+
     @action(methods=['get'], detail=False,
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        self.pagination_class = None
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_CART_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                           + ', '.join(SHOPPING_CART_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST)
+        render, content_type = SHOPPING_CART_FORMATS[file_format]
         ingredients = RecipeIngredient.objects.filter(
-            recipe__in=ShoppingCart.objects.filter(
-                user=request.user
-            ).values('recipe')
-        )
-        filename = 'shopping_cart.txt'
-        response = HttpResponse(content_type='application/octet-stream')
+            recipe__sh_cart__user=request.user
+        ).values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        ).annotate(
+            amount=Sum('amount')
+        ).order_by('name', 'measurement_unit')
+        filename = f'shopping_cart.{file_format}'
+        response = StreamingHttpResponse(
+            render(ingredients.iterator()), content_type=content_type)
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        content = [
-            f"{ingredient.ingredient.name} - {ingredient.amount} "
-            f"{ingredient.ingredient.measurement_unit}\n"
-            for ingredient in ingredients
-        ]
-        content = ''.join(content).encode('utf-8')
-        response.content = content
         return response
+
+
+def metrics(request):
+    """Метрики в формате Prometheus для сбора внутри сети контейнеров."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(render_metrics(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
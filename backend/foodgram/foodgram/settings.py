@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -25,6 +26,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +67,45 @@ DATABASES = {
         'PORT': os.getenv('DB_PORT', 5432)
     }
 }
+# DB_ENGINE=sqlite3 - локальная разработка и нагрузочные замеры
+# без PostgreSQL.
+if os.getenv('DB_ENGINE', 'postgresql') == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+# Кэш общий для всех процессов (воркеры gunicorn, обработчики очередей):
+# сброс по сигналам и версии закэшированных ответов должны видеть все.
+# Кэш в памяти процесса - только для разработки (DEBUG, один процесс).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache' if DEBUG
+            else 'django.core.cache.backends.memcached.PyMemcacheCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', '' if DEBUG else 'memcached:11211'),
+    }
+}
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60 * 60))
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+# Замеры SQL в каждом запросе: заголовок Server-Timing, журнал медленных
+# запросов и повторяющихся SQL (вероятные N+1).
+SQL_INSTRUMENTATION = os.getenv(
+    'SQL_INSTRUMENTATION', 'false').lower() == 'true'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+
+# Метрики запросов в формате Prometheus по адресу /metrics/ (nginx его
+# не проксирует). Каталог общий для всех воркеров gunicorn и очищается
+# при его старте (gunicorn.conf.py).
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -85,6 +127,23 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Изображения рецептов: ограничения на загрузку и уменьшенные копии WebP
+# (поле модели -> ширина в пикселях).
+RECIPE_IMAGE_MAX_BYTES = int(os.getenv('RECIPE_IMAGE_MAX_BYTES',
+                                       5 * 1024 * 1024))
+RECIPE_IMAGE_MAX_SIDE = int(os.getenv('RECIPE_IMAGE_MAX_SIDE', 4096))
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+RECIPE_IMAGE_DERIVATIVES = {
+    'image_thumbnail': 480,
+    'image_detail': 1200,
+}
+# Копии создаются командой process_image_jobs из очереди в БД;
+# RECIPE_IMAGE_ASYNC=false - прямо в запросе.
+RECIPE_IMAGE_ASYNC = os.getenv('RECIPE_IMAGE_ASYNC', 'true').lower() == 'true'
+IMAGE_JOB_MAX_ATTEMPTS = int(os.getenv('IMAGE_JOB_MAX_ATTEMPTS', 5))
+IMAGE_JOB_RETRY_DELAY = int(os.getenv('IMAGE_JOB_RETRY_DELAY', 30))
+IMAGE_JOB_TIMEOUT = int(os.getenv('IMAGE_JOB_TIMEOUT', 10 * 60))
+
 AUTH_USER_MODEL = 'users.User'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -94,7 +153,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication', ],
     'DEFAULT_PAGINATION_CLASS':
-        'rest_framework.pagination.PageNumberPagination',
+        'api.pagination.CustomPagination',
     'PAGE_SIZE': 6,
 }
 
@@ -112,3 +171,27 @@ MAX_LENGTH_EMAIL = 254
 MAX_LENGTH_PERSONAL_DATA = 150
 MAX_LENGTH_RECIPES_DATA = 200
 MAX_LENGTH_RECIPES_COLOR = 7
+
+# Конфигурация полнотекстового поиска рецептов в PostgreSQL.
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+
+# Популярность рецептов: период полураспада вклада добавления в избранное
+# или список покупок (в часах) и веса этих событий.
+POPULARITY_HALF_LIFE_HOURS = float(
+    os.getenv('POPULARITY_HALF_LIFE_HOURS', 72))
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_SHOPPING_CART_WEIGHT = 0.5
+
+# Лента подписок: рецепты авторов, у которых подписчиков не меньше
+# FEED_FANOUT_LIMIT, не записываются в ленты, а подмешиваются при чтении.
+# При подписке в ленту записываются FEED_BACKFILL_LIMIT последних рецептов,
+# более старые рецепты автора подмешиваются при чтении.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+FEED_BACKFILL_LIMIT = 100
+
+# Автодополнение ингредиентов: максимум результатов (параметр limit
+# ограничивается им) и время жизни индекса в памяти процесса (0 -
+# перестраивать только при смене версии ингредиентов в общем кэше).
+# Индекс строится при старте воркера gunicorn (gunicorn.conf.py).
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
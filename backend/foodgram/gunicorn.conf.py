@@ -0,0 +1,26 @@
+import glob
+import os
+
+from django.db import DatabaseError
+
+
+def on_starting(server):
+    """Удаляет файлы метрик прошлого запуска до старта воркеров."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from django.conf import settings
+
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        os.remove(path)
+
+
+def post_worker_init(worker):
+    """Строит индекс ингредиентов до первого запроса автодополнения.
+
+    Иначе загрузку всей таблицы оплачивает первый запрос в каждом воркере.
+    """
+    from recipes.ingredient_index import ingredient_index
+
+    try:
+        ingredient_index.build()
+    except DatabaseError:
+        worker.log.exception('Индекс ингредиентов не построен')
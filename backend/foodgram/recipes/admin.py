@@ -1,12 +1,16 @@
 from django.contrib import admin
+from django.db.models import Q
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.models import (Favorite, ImageJob, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.paginator import EstimatedCountPaginator
+from recipes.search import filter_search
 
 
 class RecipeIngredient(admin.TabularInline):
     model = RecipeIngredient
     extra = 0
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Tag)
@@ -17,24 +21,65 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'cooking_time', 'text', 'author',
-                    'favorites_amount')
-    search_fields = ('author__username', 'name', 'tags__name',)
+                    'favorites_amount', 'shopping_carts_count')
+    list_select_related = ('author',)
+    # Поиск по тегам через m2m требует DISTINCT по всей выборке, поэтому
+    # теги вынесены в фильтр.
+    search_fields = ('name', 'author__username',)
+    list_filter = ('tags',)
+    autocomplete_fields = ('author',)
     inlines = (RecipeIngredient,)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу вместо icontains; автор - по точному имени."""
+        if not search_term:
+            return queryset, False
+        found = filter_search(Recipe.objects.all(), search_term)
+        return queryset.filter(
+            Q(pk__in=found.values('pk'))
+            | Q(author__username=search_term.strip())
+        ), False
+
+    @admin.display(description='В избранном',
+                   ordering='favorites_count')
     def favorites_amount(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'measurement_unit',)
+    search_fields = ('name',)
+    ordering = ('name',)
+    show_full_result_count = False
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
 
 @admin.register(ShoppingCart)
-class ShoppingCart(admin.ModelAdmin):
+class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'recipe', 'status', 'attempts', 'run_after',
+                    'updated_at')
+    list_filter = ('status',)
+    list_select_related = ('recipe',)
+    autocomplete_fields = ('recipe',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
@@ -0,0 +1,84 @@
+import threading
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# Связь -> (модель со счётчиком, поле связи, поле счётчика).
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'shopping_carts_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Follow: (User, 'author_id', 'followers_count'),
+}
+
+_deleting = threading.local()
+
+
+def _deleting_objects():
+    if not hasattr(_deleting, 'objects'):
+        _deleting.objects = set()
+    return _deleting.objects
+
+
+def mark_deleting(instance, deleting=True):
+    """Объекты, удаляемые вместе со связями: их счётчики не обновляем."""
+    key = (type(instance), instance.pk)
+    if deleting:
+        _deleting_objects().add(key)
+    else:
+        _deleting_objects().discard(key)
+
+
+def is_deleting(model, pk):
+    return (model, pk) in _deleting_objects()
+
+
+def change_counter(relation, instance, delta):
+    """Атомарно изменяет счётчик, связанный с объектом relation."""
+    model, field, counter = COUNTERS[relation]
+    if is_deleting(model, getattr(instance, field)):
+        return
+    # Не уходим в минус, если счётчик уже разошёлся с таблицей связей.
+    model.objects.filter(pk=getattr(instance, field)).update(
+        **{counter: Greatest(F(counter) + delta, 0)})
+
+
+def increment_counters(relation, deltas):
+    """Приращения {pk: n} после bulk_create, минуя сигналы."""
+    model, _, counter = COUNTERS[relation]
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(
+            **{counter: F(counter) + delta})
+
+
+def actual_count(relation):
+    _, field, _ = COUNTERS[relation]
+    return Coalesce(Subquery(
+        relation.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def reconcile_counters(dry_run=False):
+    """Исправляет расхождения счётчиков с таблицами связей.
+
+    Возвращает количество исправленных строк по каждому счётчику.
+    """
+    fixed = {}
+    for relation, (model, _, counter) in COUNTERS.items():
+        drifted = model.objects.annotate(
+            actual=actual_count(relation)).exclude(**{counter: F('actual')})
+        if dry_run:
+            fixed[f'{model.__name__}.{counter}'] = drifted.count()
+            continue
+        fixed[f'{model.__name__}.{counter}'] = model.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(**{counter: actual_count(relation)})
+    return fixed
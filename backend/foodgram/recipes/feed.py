@@ -0,0 +1,116 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipes.counters import is_deleting
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+BATCH_SIZE = 2000
+
+
+def _bulk_create(entries, batch_size=BATCH_SIZE):
+    entries = iter(entries)
+    while batch := list(islice(entries, batch_size)):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fans_out(author):
+    """Рецепты записываются в ленты, пока у автора немного подписчиков."""
+    return author.followers_count < settings.FEED_FANOUT_LIMIT
+
+
+def fan_out_recipe(recipe):
+    """Записывает опубликованный рецепт в ленты подписчиков автора."""
+    followers = Follow.objects.filter(author_id=recipe.author_id).values_list(
+        'user_id', flat=True)
+    _bulk_create(
+        FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                  pub_date=recipe.pub_date)
+        for user_id in followers.iterator())
+
+
+def add_author_to_feed(user_id, author_id):
+    """При подписке в ленту записываются последние рецепты автора.
+
+    Если рецептов больше FEED_BACKFILL_LIMIT, дата самого старого из
+    записанных сохраняется в подписке: рецепты старше неё feed_keys
+    читает из рецептов автора.
+    """
+    recipes = Recipe.objects.filter(author_id=author_id, in_feeds=True)
+    dates = list(recipes.order_by('-pub_date', '-id').values_list(
+        'pub_date', flat=True)[:settings.FEED_BACKFILL_LIMIT + 1])
+    if len(dates) > settings.FEED_BACKFILL_LIMIT:
+        boundary = dates[-2]
+        recipes = recipes.filter(pub_date__gte=boundary)
+        Follow.objects.filter(user_id=user_id, author_id=author_id).update(
+            feed_pull_before=boundary)
+    _bulk_create(
+        FeedEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+        for pk, pub_date in recipes.values_list('pk', 'pub_date'))
+
+
+def remove_author_from_feed(user_id, author_id):
+    if is_deleting(User, user_id) or is_deleting(User, author_id):
+        return
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
+
+
+def rebuild_feeds(batch_size=BATCH_SIZE):
+    """Заново заполняет ленты по текущему числу подписчиков авторов.
+
+    Возвращает количество записей в лентах.
+    """
+    with transaction.atomic():
+        FeedEntry.objects.all().delete()
+        Follow.objects.exclude(feed_pull_before=None).update(
+            feed_pull_before=None)
+        Recipe.objects.update(in_feeds=False)
+        Recipe.objects.filter(
+            author__followers_count__lt=settings.FEED_FANOUT_LIMIT
+        ).update(in_feeds=True)
+        entries = Follow.objects.filter(
+            author__recipes__in_feeds=True
+        ).values_list('user_id', 'author__recipes__id',
+                      'author__recipes__pub_date')
+        _bulk_create(
+            (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                       pub_date=pub_date)
+             for user_id, recipe_id, pub_date in entries.iterator(
+                 chunk_size=batch_size)),
+            batch_size)
+    return FeedEntry.objects.count()
+
+
+def feed_keys(user, after=None, limit=None):
+    """Ключи (pub_date, id) рецептов ленты по убыванию после ключа after.
+
+    Записанная лента, рецепты популярных авторов, которые в ленты не
+    записываются, и рецепты старше записанных при подписке читаются
+    каждый по своему индексу и сливаются.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        in_feeds=False,
+        author__in=Follow.objects.filter(user=user).values('author'))
+    older = Recipe.objects.filter(
+        in_feeds=True,
+        author__following__user=user,
+        pub_date__lt=F('author__following__feed_pull_before'))
+    if after is not None:
+        pub_date, pk = after
+        entries = entries.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, recipe_id__lt=pk))
+        pulled = pulled.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+        older = older.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+    keys = set(entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit])
+    for recipes in (pulled, older):
+        keys.update(recipes.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id')[:limit])
+    return sorted(keys, reverse=True)[:limit]
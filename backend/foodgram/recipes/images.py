@@ -0,0 +1,60 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+def validate_recipe_image(file):
+    """Ограничивает размер файла и изображения рецепта."""
+    if file.size > settings.RECIPE_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            f'Размер файла не должен превышать '
+            f'{settings.RECIPE_IMAGE_MAX_BYTES // (1024 * 1024)} МБ.')
+    position = file.tell()
+    with Image.open(file) as image:
+        width, height = image.size
+    file.seek(position)
+    if max(width, height) > settings.RECIPE_IMAGE_MAX_SIDE:
+        raise ValidationError(
+            f'Стороны изображения не должны превышать '
+            f'{settings.RECIPE_IMAGE_MAX_SIDE} пикселей.')
+
+
+def resize_to_width(image, width):
+    if image.width <= width:
+        return image.copy()
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def generate_image_derivatives(recipe):
+    """Сохраняет уменьшенные копии изображения рецепта в WebP.
+
+    Ширина каждой копии задаётся в RECIPE_IMAGE_DERIVATIVES,
+    изображения меньше этой ширины не увеличиваются.
+    """
+    fields = settings.RECIPE_IMAGE_DERIVATIVES
+    for field in fields:
+        getattr(recipe, field).delete(save=False)
+    if recipe.image:
+        stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+        with recipe.image.open('rb'), Image.open(recipe.image) as original:
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'RGBA'):
+                original = original.convert(
+                    'RGBA' if 'transparency' in original.info
+                    or original.mode in ('LA', 'PA') else 'RGB')
+            for field, width in fields.items():
+                buffer = BytesIO()
+                resize_to_width(original, width).save(
+                    buffer, 'WEBP', quality=settings.RECIPE_IMAGE_QUALITY)
+                getattr(recipe, field).save(
+                    f'{stem}_{width}w.webp',
+                    ContentFile(buffer.getvalue()),
+                    save=False,
+                )
+    recipe.image_status = recipe.ImageStatus.READY
+    recipe.save(update_fields=[*fields, 'image_status'])
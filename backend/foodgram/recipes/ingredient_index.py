@@ -0,0 +1,120 @@
+import bisect
+import sys
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from api.cache import get_response_cache_version
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся отсортированными в нижнем регистре: совпадения по
+    началу строки ищутся бинарным поиском, по подстроке - одним проходом
+    str.find по склеенной строке. Единицы измерения хранятся один раз,
+    строки ссылаются на них по номеру.
+
+    Индекс помнит версию ответов по ингредиентам из общего кэша, с которой
+    построен: запись в другом процессе меняет версию, и индекс
+    перестраивается при следующем поиске.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._built_at = 0.0
+        self.build_time = 0.0
+
+    def invalidate(self):
+        self._data = None
+
+    def build(self, version=None):
+        started = time.perf_counter()
+        # Версия читается до строк: запись во время построения сменит её.
+        version = version or get_response_cache_version(Ingredient)
+        rows = sorted(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit'),
+            key=lambda row: (row[1].casefold(), row[0]),
+        )
+        units = sorted({unit for _, _, unit in rows})
+        unit_numbers = {unit: number for number, unit in enumerate(units)}
+        keys = [name.casefold().replace('\n', ' ') for _, name, _ in rows]
+        offsets = array('L')
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        self._data = (
+            keys,
+            '\n'.join(keys),
+            offsets,
+            array('q', (pk for pk, _, _ in rows)),
+            tuple(name for _, name, _ in rows),
+            tuple(units),
+            array('H', (unit_numbers[unit] for _, _, unit in rows)),
+        )
+        self._version = version
+        self._built_at = time.monotonic()
+        self.build_time = time.perf_counter() - started
+        return self._data
+
+    def _get_data(self):
+        data = self._data
+        version = get_response_cache_version(Ingredient)
+        ttl = settings.INGREDIENT_INDEX_TTL
+        if data is not None and self._version == version and (
+                not ttl or time.monotonic() - self._built_at < ttl):
+            return data
+        with self._lock:
+            if self._data is data:
+                return self.build(version)
+            return self._data
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        keys, haystack, offsets, ids, names, units, unit_numbers = (
+            self._get_data())
+        query = query.strip().casefold().replace('\n', ' ')
+        found = []
+        if not query:
+            found.extend(range(min(limit, len(keys))))
+        else:
+            position = bisect.bisect_left(keys, query)
+            while (position < len(keys) and len(found) < limit
+                   and keys[position].startswith(query)):
+                found.append(position)
+                position += 1
+            position = haystack.find(query)
+            while position != -1 and len(found) < limit:
+                number = bisect.bisect_right(offsets, position) - 1
+                if not keys[number].startswith(query):
+                    found.append(number)
+                if number + 1 == len(keys):
+                    break
+                position = haystack.find(query, offsets[number + 1])
+        return [
+            {'id': ids[number],
+             'name': names[number],
+             'measurement_unit': units[unit_numbers[number]]}
+            for number in found
+        ]
+
+    def memory_usage(self):
+        """Приблизительный объём памяти индекса в байтах."""
+        data = self._get_data()
+        keys, names, units = data[0], data[4], data[5]
+        return (sum(sys.getsizeof(part) for part in data)
+                + sum(sys.getsizeof(item) for item in keys)
+                + sum(sys.getsizeof(item) for item in names)
+                + sum(sys.getsizeof(item) for item in units))
+
+    def __len__(self):
+        return len(self._get_data()[0])
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.images import generate_image_derivatives
+from recipes.models import ImageJob, Recipe
+
+
+def schedule_image_processing(recipe):
+    """Ставит в очередь создание уменьшенных копий изображения.
+
+    Задача создаётся в той же транзакции, что и рецепт, поэтому
+    обработчик не увидит её раньше, чем сам рецепт.
+    Без RECIPE_IMAGE_ASYNC копии создаются сразу, в запросе.
+    """
+    if not recipe.image or not settings.RECIPE_IMAGE_ASYNC:
+        generate_image_derivatives(recipe)
+        return
+    recipe.image_status = Recipe.ImageStatus.PROCESSING
+    recipe.save(update_fields=['image_status'])
+    ImageJob.objects.filter(
+        recipe=recipe, status=ImageJob.Status.PENDING
+    ).delete()
+    ImageJob.objects.create(recipe=recipe, image_name=recipe.image.name)
+
+
+def requeue_stale_jobs():
+    """Возвращает в очередь задачи, обработчик которых не ответил."""
+    stale_before = timezone.now() - timedelta(
+        seconds=settings.IMAGE_JOB_TIMEOUT)
+    return ImageJob.objects.filter(
+        status=ImageJob.Status.PROCESSING, updated_at__lt=stale_before
+    ).update(status=ImageJob.Status.PENDING, updated_at=timezone.now())
+
+
+def claim_jobs(limit):
+    """Забирает задачи из очереди; параллельные обработчики их пропустят."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(ImageJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            status=ImageJob.Status.PENDING, run_after__lte=now
+        ).order_by('run_after').values_list('pk', flat=True)[:limit])
+        ImageJob.objects.filter(pk__in=ids).update(
+            status=ImageJob.Status.PROCESSING,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+    return list(ImageJob.objects.filter(pk__in=ids))
+
+
+def run_image_job(job_id):
+    """Выполняется в процессе пула обработчиков."""
+    job = ImageJob.objects.select_related('recipe').get(pk=job_id)
+    recipe = job.recipe
+    if recipe.image.name == job.image_name:
+        generate_image_derivatives(recipe)
+
+
+def complete_job(job):
+    job.status = ImageJob.Status.DONE
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'updated_at'])
+
+
+def fail_job(job, error):
+    """Повторяет задачу с растущей задержкой или помечает её ошибочной."""
+    job.last_error = repr(error)
+    if job.attempts < settings.IMAGE_JOB_MAX_ATTEMPTS:
+        job.status = ImageJob.Status.PENDING
+        job.run_after = timezone.now() + timedelta(
+            seconds=settings.IMAGE_JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = ImageJob.Status.FAILED
+        recipe = Recipe.objects.filter(pk=job.recipe_id).first()
+        if recipe is not None and recipe.image.name == job.image_name:
+            recipe.image_status = Recipe.ImageStatus.FAILED
+            recipe.save(update_fields=['image_status'])
+    job.save(update_fields=['status', 'last_error', 'run_after',
+                            'updated_at'])
@@ -0,0 +1,92 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сравнение фильтра по тегам через битовую маску с фильтром '
+            'через таблицу связей на сгенерированных данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100_000)
+        parser.add_argument("--tags", type=int, default=8)
+        parser.add_argument("--queries", type=int, default=20,
+                            help="Количество случайных наборов тегов")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            tags = self.generate(options)
+            self.compare(tags, options['queries'])
+            transaction.set_rollback(True)
+        self.stdout.write('Сгенерированные данные удалены.')
+
+    def generate(self, options):
+        started = time.perf_counter()
+        tags = []
+        for number in range(options['tags']):
+            tag = Tag(name=f'bench{number}', color='#000000',
+                      slug=f'benchmark-tag-{number}')
+            tag.save()
+            tags.append(tag)
+        author = User.objects.create(
+            email='benchmark@example.com', username='benchmark-author')
+        through = Recipe.tags.through
+        # Явные id: SQLite в Django 3.2 не возвращает их из bulk_create.
+        first_pk = (Recipe.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        batch_size = options['batch_size']
+        for start in range(0, options['recipes'], batch_size):
+            count = min(batch_size, options['recipes'] - start)
+            recipe_tags = [
+                random.sample(tags, random.randint(1, 3))
+                for _ in range(count)
+            ]
+            recipes = []
+            for number, selected in enumerate(recipe_tags, start):
+                mask = 0
+                for tag in selected:
+                    mask |= tag.mask
+                recipes.append(Recipe(
+                    pk=first_pk + number, name=f'Рецепт {number}', text='',
+                    cooking_time=1, author=author, tags_mask=mask))
+            Recipe.objects.bulk_create(recipes)
+            through.objects.bulk_create(
+                through(recipe_id=recipe.pk, tag_id=tag.pk)
+                for recipe, selected in zip(recipes, recipe_tags)
+                for tag in selected
+            )
+        self.stdout.write(
+            f"Сгенерировано {options['recipes']} рецептов за "
+            f'{time.perf_counter() - started:.1f} с')
+        return tags
+
+    def compare(self, tags, queries):
+        join_time = bitmap_time = 0.0
+        for _ in range(queries):
+            selected = random.sample(tags, random.randint(1, 3))
+            started = time.perf_counter()
+            by_join = set(Recipe.objects.filter(
+                tags__slug__in=[tag.slug for tag in selected]
+            ).distinct().values_list('pk', flat=True))
+            join_time += time.perf_counter() - started
+            started = time.perf_counter()
+            by_bitmap = set(Recipe.objects.with_any_tag(
+                selected).values_list('pk', flat=True))
+            bitmap_time += time.perf_counter() - started
+            if by_join != by_bitmap:
+                raise CommandError(
+                    f'Результаты различаются для тегов '
+                    f'{[tag.slug for tag in selected]}: '
+                    f'{len(by_join)} и {len(by_bitmap)} рецептов.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты совпадают на {queries} наборах тегов.\n'
+            f'JOIN + DISTINCT: {join_time / queries * 1000:.1f} мс/запрос\n'
+            f'Битовая маска: {bitmap_time / queries * 1000:.1f} мс/запрос'))
@@ -1,45 +1,119 @@
 import csv
+import json
+import os
+import re
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from api.cache import invalidate_response_cache
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Ingredient
+from recipes.utils import batched
+
+JSON_READ_SIZE = 64 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Потоково разбирает JSON-массив объектов, не читая файл целиком.
+
+    Разобранная часть буфера отбрасывается только при чтении следующего
+    блока, внутри блока объекты читаются по позиции.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов.')
+    position = 1
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_READ_SIZE)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {'csv': read_csv, 'json': read_json}
 
 
 class Command(BaseCommand):
-    help = 'Загрузка ингредиентов из CSV-файла'
+    help = 'Загрузка ингредиентов из CSV- или JSON-файла'
 
     def add_arguments(self, parser):
-        parser.add_argument("--path", type=str)
+        parser.add_argument("--path", type=str, required=True)
+        parser.add_argument(
+            "--format",
+            choices=READERS,
+            help="Формат файла, по умолчанию - по расширению",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
         parser.add_argument(
             "--delete-existing",
             action="store_true",
             dest="delete_existing",
             default=False,
-            help="Удалить существующие записи перед загрузкой",
+            help="Удалить ингредиенты, не используемые в рецептах",
         )
 
     def handle(self, *args, **options):
         if options["delete_existing"]:
-            for model in [Ingredient]:
-                model.objects.all().delete()
-
+            deleted, _ = Ingredient.objects.filter(
+                ingredients_recipe__isnull=True).delete()
             self.stdout.write(
                 self.style.SUCCESS(
-                    "Существующие ингредиенты удалены."
+                    f"Удалено неиспользуемых ингредиентов: {deleted}."
                 )
             )
-        csv_file = options['path']
-        ingredients = []
+        path = options['path']
+        file_format = (options['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
 
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
+        started = time.perf_counter()
+        inserted = skipped = 0
+        with open(path, 'r', encoding='utf-8') as file:
+            rows = READERS[file_format](file)
+            for chunk in batched(rows, options['chunk_size']):
+                chunk_inserted = self.upsert(chunk)
+                inserted += chunk_inserted
+                skipped += len(chunk) - chunk_inserted
+        # bulk_create не вызывает сигналы: индекс и кэш ответов сбрасываются
+        # явно.
+        ingredient_index.invalidate()
+        invalidate_response_cache(Ingredient)
+        elapsed = time.perf_counter() - started
+        total = inserted + skipped
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты успешно загружены: добавлено {inserted}, '
+            f'пропущено {skipped} за {elapsed:.2f} с '
+            f'({total / max(elapsed, 1e-9):.0f} строк в секунду).'))
 
-            for row in reader:
-                ingredient = Ingredient(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
-                ingredients.append(ingredient)
-
-        Ingredient.objects.bulk_create(ingredients)
-        self.stdout.write(self.style.SUCCESS('Ингредиенты успешно загружены.'))
+    def upsert(self, rows):
+        """Добавляет только отсутствующие в базе пары (name, unit)."""
+        rows = set(rows)
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in rows}
+        ).values_list('name', 'measurement_unit'))
+        new_rows = rows - existing
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in new_rows),
+            ignore_conflicts=True,
+        )
+        return len(new_rows)
@@ -0,0 +1,81 @@
+import json
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredient
+from recipes.utils import batched
+
+RECIPE_FIELDS = ('pk', 'name', 'text', 'cooking_time', 'pub_date', 'image',
+                 'image_thumbnail', 'image_detail', 'author__email',
+                 'author__username', 'author__first_name',
+                 'author__last_name')
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов с ингредиентами, тегами и авторами в JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", type=str, default='-',
+                            help="Файл для выгрузки, '-' - stdout")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        output = (sys.stdout if options['path'] == '-'
+                  else open(options['path'], 'w', encoding='utf-8'))
+        try:
+            count = self.export(output, options['chunk_size'])
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} в секунду).'))
+
+    def export(self, output, chunk_size):
+        """Рецепты читаются серверным курсором, связи - по пачкам."""
+        rows = Recipe.objects.order_by('pk').values_list(
+            *RECIPE_FIELDS).iterator(chunk_size=chunk_size)
+        count = 0
+        for chunk in batched(rows, chunk_size):
+            ids = [row[0] for row in chunk]
+            tags = defaultdict(list)
+            for recipe_id, slug in Recipe.tags.through.objects.filter(
+                    recipe_id__in=ids
+            ).values_list('recipe_id', 'tag__slug'):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            for recipe_id, name, unit, amount in (
+                    RecipeIngredient.objects.filter(
+                        recipe_id__in=ids
+                    ).order_by('pk').values_list(
+                        'recipe_id', 'ingredient__name',
+                        'ingredient__measurement_unit', 'amount')):
+                ingredients[recipe_id].append(
+                    {'name': name, 'measurement_unit': unit,
+                     'amount': amount})
+            for (pk, name, text, cooking_time, pub_date, image, thumbnail,
+                 detail, email, username, first_name, last_name) in chunk:
+                output.write(json.dumps({
+                    'name': name,
+                    'text': text,
+                    'cooking_time': cooking_time,
+                    'pub_date': pub_date.isoformat(),
+                    'image': image or None,
+                    'image_thumbnail': thumbnail or None,
+                    'image_detail': detail or None,
+                    'author': {
+                        'email': email,
+                        'username': username,
+                        'first_name': first_name,
+                        'last_name': last_name,
+                    },
+                    'tags': tags[pk],
+                    'ingredients': ingredients[pk],
+                }, ensure_ascii=False) + '\n')
+            count += len(chunk)
+        return count
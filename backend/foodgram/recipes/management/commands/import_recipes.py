@@ -0,0 +1,203 @@
+import json
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from api.cache import invalidate_response_cache
+from recipes.counters import increment_counters
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (ImageJob, Ingredient, Recipe, RecipeIngredient,
+                            Tag)
+from recipes.search import update_search_index
+from recipes.utils import batched
+from users.models import User
+
+from .process_image_jobs import init_worker
+
+
+def read_records(path, shard=0, shards=1):
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file):
+            if number % shards == shard and line.strip():
+                yield json.loads(line)
+
+
+def prepare_references(path, chunk_size):
+    """Создаёт недостающих авторов, теги и ингредиенты.
+
+    Выполняется в одном процессе до импорта рецептов, поэтому
+    параллельные обработчики справочники только читают.
+    """
+    authors, slugs, ingredients = {}, set(), set()
+    for record in read_records(path):
+        authors.setdefault(record['author']['email'], record['author'])
+        slugs.update(record['tags'])
+        ingredients.update(
+            (item['name'], item['measurement_unit'])
+            for item in record['ingredients'])
+
+    existing = set()
+    for chunk in batched(authors, chunk_size):
+        existing.update(User.objects.filter(email__in=chunk).values_list(
+            'email', flat=True))
+    password = make_password(None)
+    User.objects.bulk_create(
+        (User(password=password, **author)
+         for email, author in authors.items() if email not in existing),
+        batch_size=chunk_size,
+        ignore_conflicts=True,
+    )
+
+    existing = set(Tag.objects.filter(slug__in=slugs).values_list(
+        'slug', flat=True))
+    for slug in sorted(slugs - existing):
+        Tag.objects.create(name=slug, slug=slug, color='#000000')
+
+    existing = set(Ingredient.objects.values_list('name', 'measurement_unit'))
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit=unit)
+         for name, unit in ingredients - existing),
+        batch_size=chunk_size,
+    )
+    # bulk_create не вызывает сигналы: индекс и кэш ответов сбрасываются
+    # явно.
+    ingredient_index.invalidate()
+    invalidate_response_cache(Ingredient)
+
+
+class RecipeImporter:
+    """Импорт пачек рецептов с кэшем id авторов, тегов и ингредиентов."""
+
+    def __init__(self):
+        self.authors = {}
+        self.tags = {tag.slug: tag for tag in Tag.objects.all()}
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+
+    def load_authors(self, emails):
+        missing = set(emails) - self.authors.keys()
+        if missing:
+            self.authors.update(User.objects.filter(
+                email__in=missing).values_list('email', 'pk'))
+
+    def build_recipe(self, record):
+        mask = 0
+        for slug in record['tags']:
+            if self.tags[slug].bit is not None:
+                mask |= self.tags[slug].mask
+        image = record.get('image') or ''
+        ready = not image or record.get('image_thumbnail')
+        return Recipe(
+            name=record['name'],
+            text=record['text'],
+            cooking_time=record['cooking_time'],
+            author_id=self.authors[record['author']['email']],
+            image=image,
+            image_thumbnail=record.get('image_thumbnail') or '',
+            image_detail=record.get('image_detail') or '',
+            image_status=(Recipe.ImageStatus.READY if ready
+                          else Recipe.ImageStatus.PROCESSING),
+            tags_mask=mask,
+        )
+
+    @transaction.atomic
+    def import_chunk(self, records):
+        """Возвращает количество импортированных и пропущенных записей."""
+        self.load_authors(record['author']['email'] for record in records)
+        records = [record for record in records
+                   if record['author']['email'] in self.authors]
+        recipes = [self.build_recipe(record) for record in records]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            # bulk_create не отправляет post_save, счётчики и поисковый
+            # индекс - вручную.
+            increment_counters(
+                Recipe, Counter(recipe.author_id for recipe in recipes))
+            update_search_index(recipe.pk for recipe in recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        # auto_now_add перезаписывает дату при вставке, возвращаем исходную.
+        for recipe, record in zip(recipes, records):
+            if record.get('pub_date'):
+                recipe.pub_date = parse_datetime(record['pub_date'])
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk,
+                                tag_id=self.tags[slug].pk)
+            for recipe, record in zip(recipes, records)
+            for slug in dict.fromkeys(record['tags'])
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=self.ingredients[
+                    item['name'], item['measurement_unit']],
+                amount=item['amount'],
+            )
+            for recipe, record in zip(recipes, records)
+            for item in record['ingredients']
+        )
+        ImageJob.objects.bulk_create(
+            ImageJob(recipe_id=recipe.pk, image_name=recipe.image.name)
+            for recipe in recipes
+            if recipe.image_status == Recipe.ImageStatus.PROCESSING
+        )
+        return len(recipes), len(records) - len(recipes)
+
+
+def import_shard(path, shard, shards, chunk_size):
+    importer = RecipeImporter()
+    imported = skipped = 0
+    for chunk in batched(read_records(path, shard, shards), chunk_size):
+        chunk_imported, chunk_skipped = importer.import_chunk(chunk)
+        imported += chunk_imported
+        skipped += chunk_skipped
+    return imported, skipped
+
+
+class Command(BaseCommand):
+    help = 'Загрузка рецептов из JSONL-файла, выгруженного export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", type=str, required=True)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Количество процессов загрузки",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        path, chunk_size = options['path'], options['chunk_size']
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            raise CommandError(
+                'SQLite не поддерживает параллельную запись, '
+                'используйте --workers 1.')
+        prepare_references(path, chunk_size)
+        if workers == 1:
+            results = [import_shard(path, 0, 1, chunk_size)]
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=init_worker) as executor:
+                results = list(executor.map(
+                    import_shard, [path] * workers, range(workers),
+                    [workers] * workers, [chunk_size] * workers))
+        imported = sum(result[0] for result in results)
+        skipped = sum(result[1] for result in results)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {imported}, пропущено: {skipped} '
+            f'за {elapsed:.1f} с ({imported / max(elapsed, 1e-9):.0f} '
+            f'в секунду).'))
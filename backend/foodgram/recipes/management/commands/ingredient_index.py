@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.ingredient_index import ingredient_index
+
+
+class Command(BaseCommand):
+    help = 'Статистика индекса ингредиентов: размер и время построения'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--query", type=str, default='',
+                            help="Выполнить пробный поиск")
+        parser.add_argument("--limit", type=int, default=10)
+
+    def handle(self, *args, **options):
+        ingredient_index.build()
+        self.stdout.write(
+            f'Ингредиентов: {len(ingredient_index)}\n'
+            f'Построение: {ingredient_index.build_time * 1000:.1f} мс\n'
+            f'Память: {ingredient_index.memory_usage() / 1024:.1f} КБ'
+        )
+        if options['query']:
+            started = time.perf_counter()
+            results = ingredient_index.search(options['query'],
+                                              options['limit'])
+            elapsed = time.perf_counter() - started
+            for item in results:
+                self.stdout.write(
+                    f"{item['name']} ({item['measurement_unit']})")
+            self.stdout.write(f'Поиск: {elapsed * 1_000_000:.0f} мкс')
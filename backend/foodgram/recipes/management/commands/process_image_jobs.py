@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.jobs import (claim_jobs, complete_job, fail_job,
+                          requeue_stale_jobs, run_image_job)
+
+
+def init_worker():
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2,
+                            help="Количество процессов обработки")
+        parser.add_argument("--batch-size", type=int, default=10)
+        parser.add_argument("--poll-interval", type=float, default=2.0,
+                            help="Пауза в секундах, когда очередь пуста")
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Обработать текущую очередь и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        with ProcessPoolExecutor(max_workers=options['workers'],
+                                 initializer=init_worker) as executor:
+            while True:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(
+                        f'Возвращено в очередь зависших задач: {requeued}')
+                jobs = claim_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                self.process(executor, jobs)
+
+    def process(self, executor, jobs):
+        futures = {executor.submit(run_image_job, job.pk): job
+                   for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                future.result()
+            except Exception as error:
+                fail_job(job, error)
+                self.stderr.write(
+                    f'Рецепт {job.recipe_id}: {error!r} '
+                    f'(попытка {job.attempts}, статус {job.status})')
+            else:
+                complete_job(job)
+                self.stdout.write(f'Рецепт {job.recipe_id}: готово')
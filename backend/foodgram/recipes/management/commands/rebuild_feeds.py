@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.feed import BATCH_SIZE, rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = ('Заполнение лент подписок заново, например после изменения '
+            'FEED_FANOUT_LIMIT или массовой загрузки рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_feeds(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {count}, '
+            f'за {time.perf_counter() - started:.2f} с.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Сверка счётчиков избранного, списков покупок, рецептов и '
+            'подписчиков с таблицами связей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Только показать расхождения",
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters(options['dry_run'])
+        verb = 'Расхождений' if options['dry_run'] else 'Исправлено'
+        for counter, count in fixed.items():
+            self.stdout.write(f'{counter}: {verb.lower()} {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} всего: {sum(fixed.values())}.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.popularity import BATCH_SIZE, refresh_popularity
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт рейтинга популярности рецептов с затуханием по времени'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Повторять пересчёт каждые N секунд (0 - один раз)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            count = refresh_popularity(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Рецептов в рейтинге: {count}, '
+                f'пересчёт за {time.perf_counter() - started:.2f} с.'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
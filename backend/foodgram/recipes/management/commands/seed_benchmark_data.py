@@ -0,0 +1,189 @@
+import random
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.counters import reconcile_counters
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.feed import rebuild_feeds
+from recipes.popularity import refresh_popularity
+from recipes.search import update_search_index
+from recipes.tag_bitmap import MAX_TAG_BITS
+from users.models import Follow, User
+
+SEED_PASSWORD = 'benchmark-password'
+
+
+def next_pk(model):
+    """Явные id: SQLite в Django 3.2 не возвращает их из bulk_create."""
+    return (model.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+
+def unique_pairs(left, right, count, exclude_same=False):
+    """Случайные неповторяющиеся пары для таблиц с unique_together."""
+    limit = len(left) * len(right) - (len(left) if exclude_same else 0)
+    if count > limit:
+        raise CommandError(f'Нельзя получить {count} уникальных пар, '
+                           f'максимум {limit}.')
+    pairs = set()
+    while len(pairs) < count:
+        pair = (random.choice(left), random.choice(right))
+        if not (exclude_same and pair[0] == pair[1]):
+            pairs.add(pair)
+    return pairs
+
+
+class Command(BaseCommand):
+    help = ('Генерация пользователей, рецептов, избранного, списков '
+            'покупок и подписок для нагрузочных замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--recipes", type=int, default=2000)
+        parser.add_argument("--ingredients", type=int, default=500)
+        parser.add_argument("--tags", type=int, default=8)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=6)
+        parser.add_argument("--favorites", type=int, default=10_000)
+        parser.add_argument("--carts", type=int, default=3000)
+        parser.add_argument("--follows", type=int, default=2000)
+        parser.add_argument("--activity-days", type=int, default=30,
+                            help="Период, за который распределяются "
+                                 "добавления в избранное и корзину")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['tags'] > MAX_TAG_BITS:
+            raise CommandError(
+                f'Поддерживается не более {MAX_TAG_BITS} тегов.')
+        random.seed(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        with transaction.atomic():
+            # Префикс от номера прогона: повторный запуск не конфликтует
+            # с уникальными email, username и slug прошлых данных.
+            prefix = f'seed{next_pk(User)}'
+            users = self.create_users(prefix, options['users'])
+            tags = self.create_tags(prefix, options['tags'])
+            ingredients = self.create_ingredients(
+                prefix, options['ingredients'])
+            recipes = self.create_recipes(
+                users, tags, ingredients, options)
+            activity = timedelta(days=options['activity_days'])
+            self.create_pairs(Favorite, 'user_id', 'recipe_id',
+                              users, recipes, options['favorites'],
+                              activity=activity)
+            self.create_pairs(ShoppingCart, 'user_id', 'recipe_id',
+                              users, recipes, options['carts'],
+                              activity=activity)
+            self.create_pairs(Follow, 'user_id', 'author_id',
+                              users, users, options['follows'],
+                              exclude_same=True)
+            reconcile_counters()
+            refresh_popularity()
+            rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные сгенерированы за {time.perf_counter() - started:.1f} с. '
+            f'Пароль пользователей: {SEED_PASSWORD}'))
+
+    def bulk_create(self, model, objects):
+        objects = iter(objects)
+        while batch := list(islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch)
+
+    def report(self, model, count):
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {count}')
+
+    def create_users(self, prefix, count):
+        first_pk = next_pk(User)
+        password = make_password(SEED_PASSWORD)
+        self.bulk_create(User, (
+            User(pk=first_pk + number,
+                 email=f'{prefix}-{number}@example.com',
+                 username=f'{prefix}-{number}',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for number in range(count)
+        ))
+        self.report(User, count)
+        return list(range(first_pk, first_pk + count))
+
+    def create_tags(self, prefix, count):
+        tags = []
+        # По одному: номер бита маски назначается сигналом pre_save.
+        for number in range(count):
+            tag = Tag(name=f'Тег {prefix}-{number}',
+                      color=f'#{random.randrange(0x1000000):06X}',
+                      slug=f'{prefix}-{number}')
+            tag.save()
+            tags.append(tag)
+        self.report(Tag, count)
+        return tags
+
+    def create_ingredients(self, prefix, count):
+        first_pk = next_pk(Ingredient)
+        self.bulk_create(Ingredient, (
+            Ingredient(pk=first_pk + number,
+                       name=f'Ингредиент {prefix}-{number}',
+                       measurement_unit=random.choice(('г', 'мл', 'шт')))
+            for number in range(count)
+        ))
+        self.report(Ingredient, count)
+        return list(range(first_pk, first_pk + count))
+
+    def create_recipes(self, users, tags, ingredients, options):
+        count = options['recipes']
+        per_recipe = min(options['ingredients_per_recipe'],
+                         len(ingredients))
+        first_pk = next_pk(Recipe)
+        through = Recipe.tags.through
+        recipe_tags = {}
+        recipes = []
+        for number in range(count):
+            pk = first_pk + number
+            recipe_tags[pk] = random.sample(
+                tags, random.randint(1, min(3, len(tags)))) if tags else []
+            mask = 0
+            for tag in recipe_tags[pk]:
+                mask |= tag.mask
+            recipes.append(Recipe(
+                pk=pk, name=f'Рецепт {number}',
+                text='Описание рецепта. ' * random.randint(1, 20),
+                cooking_time=random.randint(1, 180),
+                author_id=random.choice(users), tags_mask=mask))
+        self.bulk_create(Recipe, recipes)
+        self.bulk_create(through, (
+            through(recipe_id=pk, tag_id=tag.pk)
+            for pk, selected in recipe_tags.items() for tag in selected
+        ))
+        self.bulk_create(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe.pk, ingredient_id=ingredient,
+                             amount=random.randint(1, 500))
+            for recipe in recipes
+            for ingredient in random.sample(ingredients, per_recipe)
+        ))
+        update_search_index(recipe.pk for recipe in recipes)
+        self.report(Recipe, count)
+        return [recipe.pk for recipe in recipes]
+
+    def create_pairs(self, model, left_field, right_field, left, right,
+                     count, exclude_same=False, activity=None):
+        now = timezone.now()
+
+        def extra():
+            if activity is None:
+                return {}
+            return {'created_at': now - activity * random.random()}
+
+        self.bulk_create(model, (
+            model(**{left_field: left_pk, right_field: right_pk}, **extra())
+            for left_pk, right_pk in unique_pairs(
+                left, right, count, exclude_same)
+        ))
+        self.report(model, count)
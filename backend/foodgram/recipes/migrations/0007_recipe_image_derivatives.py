@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+import recipes.images
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_tags_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_detail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='recipes/derivatives/', verbose_name='Изображение для страницы рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='recipes/derivatives/', verbose_name='Миниатюра для списка'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, default=None, null=True, upload_to='', validators=[recipes.images.validate_recipe_image]),
+        ),
+    ]
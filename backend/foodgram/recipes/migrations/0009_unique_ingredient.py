@@ -0,0 +1,49 @@
+# Generated by Django 3.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('pk'), count=Count('pk')).filter(count__gt=1)
+    for duplicate in duplicates:
+        others = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(pk=duplicate['keep'])
+        RecipeIngredient.objects.filter(ingredient__in=others).update(
+            ingredient_id=duplicate['keep'])
+        others.delete()
+        # Рецепт мог содержать и оставленный ингредиент, и его дубль:
+        # такие строки объединяются с суммой количеств.
+        repeated = RecipeIngredient.objects.filter(
+            ingredient_id=duplicate['keep']
+        ).values('recipe_id').annotate(
+            first=Min('pk'), total=Sum('amount'), count=Count('pk')
+        ).filter(count__gt=1)
+        for row in repeated:
+            RecipeIngredient.objects.filter(pk=row['first']).update(
+                amount=row['total'])
+            RecipeIngredient.objects.filter(
+                recipe_id=row['recipe_id'], ingredient_id=duplicate['keep']
+            ).exclude(pk=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_image_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 21:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Favorite', 'recipe', 'recipes', 'Recipe', 'favorites_count'),
+    ('recipes', 'ShoppingCart', 'recipe', 'recipes', 'Recipe',
+     'shopping_carts_count'),
+    ('recipes', 'Recipe', 'author', 'users', 'User', 'recipes_count'),
+    ('users', 'Follow', 'author', 'users', 'User', 'followers_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, relation, field, counter_app, model, counter in COUNTERS:
+        related = apps.get_model(app, relation)
+        apps.get_model(counter_app, model).objects.update(**{
+            counter: Coalesce(Subquery(
+                related.objects.filter(**{field: OuterRef('pk')}).order_by(
+                ).values(field).annotate(count=Count('pk')).values('count')
+            ), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+        ('recipes', '0009_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
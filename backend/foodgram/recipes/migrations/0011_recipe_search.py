@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 22:00
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        config = settings.RECIPE_SEARCH_CONFIG
+        schema_editor.execute(
+            'CREATE TABLE recipes_recipe_search ('
+            'recipe_id bigint PRIMARY KEY REFERENCES recipes_recipe (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)')
+        schema_editor.execute(
+            'CREATE INDEX recipes_recipe_search_document_gin '
+            'ON recipes_recipe_search USING gin (document)')
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_search (recipe_id, document) '
+            "SELECT id, setweight(to_tsvector(%s::regconfig, name), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, text), 'B') "
+            'FROM recipes_recipe', (config, config))
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_search USING fts5('
+            "name, text, tokenize = 'unicode61 remove_diacritics 2')")
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_search (rowid, name, text) '
+            'SELECT id, name, text FROM recipes_recipe')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-18 22:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_popularity(apps, schema_editor):
+    # Время добавления существующих записей неизвестно: все они получают
+    # дату миграции, поэтому рейтинг равен взвешенной сумме счётчиков.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipePopularity = apps.get_model('recipes', 'RecipePopularity')
+    recipes = Recipe.objects.filter(
+        models.Q(favorites_count__gt=0) | models.Q(shopping_carts_count__gt=0)
+    ).values_list('pk', 'favorites_count', 'shopping_carts_count')
+    RecipePopularity.objects.bulk_create(
+        (RecipePopularity(
+            recipe_id=pk,
+            score=favorites * settings.POPULARITY_FAVORITE_WEIGHT
+            + carts * settings.POPULARITY_SHOPPING_CART_WEIGHT)
+         for pk, favorites, carts in recipes.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='Добавлен'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='Добавлен'),
+        ),
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='recipes.recipe')),
+                ('score', models.FloatField(default=0, verbose_name='Популярность')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipepopularity',
+            index=models.Index(fields=['-score', '-recipe'], name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
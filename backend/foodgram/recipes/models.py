@@ -1,9 +1,20 @@
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Value,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
-from users.models import User
+from users.models import User, fields_without_counters
+
+from .images import validate_recipe_image
+
+
+TAG_SAVE_ATTEMPTS = 3
+RECIPE_COUNTERS = ('favorites_count', 'shopping_carts_count')
 
 
 class Tag(models.Model):
@@ -11,6 +22,12 @@ class Tag(models.Model):
     color = models.CharField(max_length=settings.MAX_LENGTH_RECIPES_COLOR)
     slug = models.SlugField(max_length=settings.MAX_LENGTH_RECIPES_DATA,
                             unique=True)
+    bit = models.PositiveSmallIntegerField(
+        'Номер бита в маске тегов рецепта',
+        null=True,
+        unique=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Тэг'
@@ -19,13 +36,114 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Номер бита назначает сигнал pre_save (recipes/signals.py).
+
+        Два одновременно создаваемых тега могут выбрать один свободный
+        номер; уникальность bit не даст сохранить второй, и он повторит
+        сохранение со следующим свободным номером.
+        """
+        for attempt in range(TAG_SAVE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if (attempt + 1 == TAG_SAVE_ATTEMPTS or self.bit is None
+                        or not Tag.objects.filter(bit=self.bit).exclude(
+                            pk=self.pk).exists()):
+                    raise
+                self.bit = None
+
+    @property
+    def mask(self):
+        """0 для тега без номера бита: такие теги ищутся через m2m."""
+        return 0 if self.bit is None else 1 << self.bit
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Добавляет автора и флаги избранного/корзины одним запросом."""
+        queryset = self.select_related('author')
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def with_any_tag(self, tags):
+        """Рецепты хотя бы с одним из тегов: проверка битовой маски.
+
+        Для тегов без номера бита используется обычное соединение
+        с таблицей связей.
+        """
+        if any(tag.bit is None for tag in tags):
+            return self.filter(tags__in=tags).distinct()
+        mask = 0
+        for tag in tags:
+            mask |= tag.mask
+        return self.alias(
+            selected_tags=F('tags_mask').bitand(mask)
+        ).exclude(selected_tags=0)
+
+    def top_per_author(self, limit):
+        """Не более limit последних рецептов каждого автора.
+
+        Нумерация рецептов внутри автора выполняется оконной функцией
+        ROW_NUMBER, поэтому лишние рецепты не покидают базу данных.
+        """
+        ranked = self.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=[F('pub_date').desc(), F('pk').desc()],
+        )).values('pk', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit),
+        ))
+
 
 class Recipe(models.Model):
+
+    class ImageStatus(models.TextChoices):
+        PROCESSING = 'processing', 'Обрабатывается'
+        READY = 'ready', 'Готово'
+        FAILED = 'failed', 'Ошибка обработки'
+
     tags = models.ManyToManyField(Tag)
     image = models.ImageField(
         null=True,
         default=None,
         blank=True,
+        validators=[validate_recipe_image],
+    )
+    image_thumbnail = models.ImageField(
+        'Миниатюра для списка',
+        upload_to='recipes/derivatives/',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    image_detail = models.ImageField(
+        'Изображение для страницы рецепта',
+        upload_to='recipes/derivatives/',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    image_status = models.CharField(
+        'Состояние обработки изображения',
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        editable=False,
     )
     name = models.CharField(max_length=settings.MAX_LENGTH_RECIPES_DATA)
     cooking_time = models.PositiveIntegerField(validators=[
@@ -41,13 +159,53 @@ class Recipe(models.Model):
         through='RecipeIngredient',
         through_fields=('recipe', 'ingredient'))
 
+    pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    tags_mask = models.BigIntegerField(
+        'Битовая маска тегов',
+        default=0,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    in_feeds = models.BooleanField(
+        'Разослан в ленты подписчиков',
+        default=False,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_idx'),
+            # Рецепты, которые подмешиваются в ленты при чтении.
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         condition=models.Q(in_feeds=False),
+                         name='recipe_feed_pull_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = fields_without_counters(
+            self, RECIPE_COUNTERS, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=settings.MAX_LENGTH_RECIPES_DATA)
@@ -55,6 +213,12 @@ class Ingredient(models.Model):
         max_length=settings.MAX_LENGTH_RECIPES_DATA)
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -86,6 +250,8 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorites',
     )
+    created_at = models.DateTimeField('Добавлен', default=timezone.now,
+                                      editable=False, db_index=True)
 
     class Meta:
         unique_together = ('user', 'recipe')
@@ -99,7 +265,7 @@ class Favorite(models.Model):
                 'избранное.')
 
     def __str__(self):
-        return (f'Пользователь {self.user} добавил в избранное'
+        return (f'Пользователь {self.user} добавил в избранное '
                 f'рецепт {self.recipe}')
 
 
@@ -114,6 +280,8 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='sh_cart'
     )
+    created_at = models.DateTimeField('Добавлен', default=timezone.now,
+                                      editable=False, db_index=True)
 
     class Meta:
         unique_together = ('user', 'recipe')
@@ -125,3 +293,92 @@ class ShoppingCart(models.Model):
         ]
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class RecipePopularity(models.Model):
+    """Рейтинг популярности рецепта с затуханием по времени.
+
+    Пересчитывается командой refresh_popularity, между пересчётами
+    обновляется сигналами избранного и списка покупок.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+    )
+    score = models.FloatField('Популярность', default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('-score', '-recipe'),
+                         name='recipe_popularity_idx'),
+        ]
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика, записанный при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_entry_user_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+
+class ImageJob(models.Model):
+    """Задача на обработку изображения рецепта вне запроса."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        PROCESSING = 'processing', 'Выполняется'
+        DONE = 'done', 'Выполнена'
+        FAILED = 'failed', 'Ошибка'
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+    )
+    image_name = models.CharField('Файл изображения', max_length=255)
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    updated_at = models.DateTimeField('Обновлена', auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('status', 'run_after'),
+                         name='image_job_queue_idx'),
+        ]
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.image_name} ({self.status})'
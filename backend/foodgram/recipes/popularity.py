@@ -0,0 +1,111 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from recipes.counters import is_deleting
+from recipes.models import Favorite, Recipe, RecipePopularity, ShoppingCart
+
+BATCH_SIZE = 2000
+# Вклад событий старше стольких периодов полураспада меньше 0,1 %.
+WINDOW_HALF_LIVES = 10
+# События последней минуты перечитываются под блокировкой таблицы
+# рейтинга: транзакции, которые их добавили, к этому времени завершены.
+REPLAY_WINDOW = timedelta(minutes=1)
+
+
+def activity_weights():
+    return {
+        Favorite: settings.POPULARITY_FAVORITE_WEIGHT,
+        ShoppingCart: settings.POPULARITY_SHOPPING_CART_WEIGHT,
+    }
+
+
+def decay(age):
+    """Множитель вклада события возрастом age (timedelta)."""
+    half_life = settings.POPULARITY_HALF_LIFE_HOURS * 3600
+    return 0.5 ** (max(age.total_seconds(), 0) / half_life)
+
+
+def add_activity(relation, instance):
+    """Новое событие входит в рейтинг с полным весом.
+
+    Рейтинг в таблице посчитан на момент последнего пересчёта; разница
+    с точным значением мала, пока пересчёт идёт чаще периода полураспада.
+    """
+    weight = activity_weights()[relation]
+    popularity = RecipePopularity.objects.filter(recipe_id=instance.recipe_id)
+    if popularity.update(score=F('score') + weight):
+        return
+    # При одновременной вставке одно из событий теряется до пересчёта.
+    RecipePopularity.objects.bulk_create(
+        [RecipePopularity(recipe_id=instance.recipe_id, score=weight)],
+        ignore_conflicts=True)
+
+
+def remove_activity(relation, instance):
+    """Вычитает вклад события с учётом его возраста."""
+    if is_deleting(Recipe, instance.recipe_id):
+        return
+    weight = activity_weights()[relation] * decay(
+        timezone.now() - instance.created_at)
+    RecipePopularity.objects.filter(recipe_id=instance.recipe_id).update(
+        score=Greatest(F('score') - weight, 0.0))
+
+
+def add_scores(scores, now, since, until=None, batch_size=BATCH_SIZE):
+    """Добавляет к scores вклад событий с since до until."""
+    for relation, weight in activity_weights().items():
+        events = relation.objects.filter(created_at__gte=since)
+        if until is not None:
+            events = events.filter(created_at__lt=until)
+        for recipe_id, created_at in events.values_list(
+                'recipe_id', 'created_at').iterator(chunk_size=batch_size):
+            scores[recipe_id] += weight * decay(now - created_at)
+
+
+def refresh_popularity(now=None, batch_size=BATCH_SIZE):
+    """Пересчитывает рейтинг по событиям за окно затухания.
+
+    Рейтинг по событиям до отсечки (now - REPLAY_WINDOW) считается без
+    блокировок. Затем таблица рейтинга блокируется от записи: события
+    после отсечки добавляются к рейтингу, строки заменяются. Сигналы
+    add_activity и remove_activity на время замены ждут и применяются
+    к новым строкам. Удаления событий, прошедшие между подсчётом и
+    блокировкой, учитываются при следующем пересчёте.
+
+    Возвращает количество рецептов в рейтинге.
+    """
+    now = now or timezone.now()
+    cutoff = now - REPLAY_WINDOW
+    scores = defaultdict(float)
+    add_scores(scores, now, now - timedelta(
+        hours=settings.POPULARITY_HALF_LIFE_HOURS * WINDOW_HALF_LIVES),
+        cutoff, batch_size)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE'.format(
+                        connection.ops.quote_name(
+                            RecipePopularity._meta.db_table)))
+        # В SQLite запись блокирует всю базу уже с первого DELETE.
+        RecipePopularity.objects.all().delete()
+        add_scores(scores, now, cutoff, batch_size=batch_size)
+        rows = (RecipePopularity(recipe_id=recipe_id, score=score)
+                for recipe_id, score in scores.items())
+        count = 0
+        while batch := list(islice(rows, batch_size)):
+            # Рецепт могли удалить после подсчёта без блокировки.
+            alive = set(Recipe.objects.filter(
+                pk__in=[row.recipe_id for row in batch]
+            ).values_list('pk', flat=True))
+            batch = [row for row in batch if row.recipe_id in alive]
+            RecipePopularity.objects.bulk_create(batch)
+            count += len(batch)
+    return count
@@ -0,0 +1,141 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# PostgreSQL: таблица (recipe_id, document tsvector) с GIN-индексом.
+# SQLite: виртуальная таблица FTS5, rowid совпадает с id рецепта.
+SEARCH_TABLE = 'recipes_recipe_search'
+CHUNK_SIZE = 500
+
+PG_DOCUMENT = ("setweight(to_tsvector(%s::regconfig, name), 'A') || "
+               "setweight(to_tsvector(%s::regconfig, text), 'B')")
+PG_QUERY = 'to_tsquery(%s::regconfig, %s)'
+# Веса bm25 для столбцов name и text.
+FTS_RANK = f'bm25({SEARCH_TABLE}, 10.0, 1.0)'
+
+
+def _chunks(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        yield recipe_ids[start:start + CHUNK_SIZE]
+
+
+def update_search_index(recipe_ids):
+    """Переиндексирует название и описание указанных рецептов."""
+    vendor = connection.vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        return
+    config = settings.RECIPE_SEARCH_CONFIG
+    with connection.cursor() as cursor:
+        for chunk in _chunks(recipe_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            if vendor == 'postgresql':
+                cursor.execute(
+                    f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) '
+                    f'SELECT id, {PG_DOCUMENT} FROM recipes_recipe '
+                    f'WHERE id IN ({placeholders}) '
+                    f'ON CONFLICT (recipe_id) '
+                    f'DO UPDATE SET document = EXCLUDED.document',
+                    [config, config, *chunk])
+            else:
+                cursor.execute(
+                    f'DELETE FROM {SEARCH_TABLE} '
+                    f'WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(
+                    f'INSERT INTO {SEARCH_TABLE} (rowid, name, text) '
+                    f'SELECT id, name, text FROM recipes_recipe '
+                    f'WHERE id IN ({placeholders})', chunk)
+
+
+def remove_from_search_index(recipe_ids):
+    """В PostgreSQL строки индекса удаляются каскадно по внешнему ключу."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(recipe_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} '
+                f'WHERE rowid IN ({placeholders})', chunk)
+
+
+def search_words(query):
+    return re.findall(r'\w+', query)
+
+
+def fts_query(query):
+    """Слова запроса для FTS5: все обязательны, совпадение по префиксу."""
+    return ' '.join(f'"{word}"*' for word in search_words(query))
+
+
+def pg_query(query):
+    """Слова запроса для to_tsquery: через &, совпадение по префиксу."""
+    return ' & '.join(f'{word}:*' for word in search_words(query))
+
+
+def filter_search(queryset, query):
+    """Рецепты, название или описание которых соответствует запросу.
+
+    Каждое слово запроса ищется как начало слова в названии или описании
+    на всех бэкендах.
+    """
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        match = pg_query(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT recipe_id FROM {SEARCH_TABLE} '
+            f'WHERE document @@ {PG_QUERY}',
+            (settings.RECIPE_SEARCH_CONFIG, match)))
+    if vendor == 'sqlite':
+        match = fts_query(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s', (match,)))
+    words = search_words(query)
+    if not words:
+        return queryset.none()
+    for word in words:
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(text__icontains=word))
+    return queryset
+
+
+def search_rank(queryset, query):
+    """Ранг найденного рецепта: подзапрос к индексу по id рецепта."""
+    vendor = connection.vendor
+    table = queryset.model._meta.db_table
+    if vendor == 'postgresql':
+        return RawSQL(
+            f'SELECT ts_rank(document, {PG_QUERY}) FROM {SEARCH_TABLE} '
+            f'WHERE recipe_id = {table}.id',
+            (settings.RECIPE_SEARCH_CONFIG, pg_query(query)),
+            output_field=FloatField())
+    if vendor == 'sqlite':
+        # Ранги считаются одним запросом к FTS5 и материализуются: иначе
+        # SQLite повторяет поиск для каждой строки. MATERIALIZED - с 3.35.
+        materialized = ('MATERIALIZED '
+                        if connection.Database.sqlite_version_info >= (3, 35)
+                        else '')
+        # bm25 тем меньше, чем релевантнее запись.
+        return RawSQL(
+            f'WITH ranked AS {materialized}('
+            f'SELECT rowid AS recipe_id, -{FTS_RANK} AS rank '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s) '
+            f'SELECT rank FROM ranked WHERE recipe_id = {table}.id',
+            (fts_query(query),), output_field=FloatField())
+    return Value(0.0, output_field=FloatField())
+
+
+def search_recipes(queryset, query):
+    """Найденные рецепты, упорядоченные по релевантности (search_rank)."""
+    queryset = filter_search(queryset, query)
+    return queryset.annotate(
+        search_rank=search_rank(queryset, query)
+    ).order_by('-search_rank', '-pub_date', '-id')
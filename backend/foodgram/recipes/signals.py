@@ -0,0 +1,127 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.counters import change_counter, mark_deleting
+from recipes.feed import (add_author_to_feed, fan_out_recipe, fans_out,
+                          remove_author_from_feed)
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.popularity import add_activity, remove_activity
+from recipes.search import remove_from_search_index, update_search_index
+from recipes.tag_bitmap import free_bit, refresh_tags_mask
+from users.models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(pre_save, sender=Tag)
+def assign_tag_bit(sender, instance, **kwargs):
+    if instance.bit is None:
+        instance.bit = free_bit()
+
+
+@receiver(pre_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    if instance.bit is not None:
+        Recipe.objects.filter(tags=instance).update(
+            tags_mask=F('tags_mask').bitand(~instance.mask))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """Поддерживает Recipe.tags_mask в соответствии с Recipe.tags."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_tags_mask([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_tags_mask(instance._cleared_recipe_ids)
+    elif action in ('post_add', 'post_remove'):
+        refresh_tags_mask(pk_set)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+def increment_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+def decrement_counter(sender, instance, **kwargs):
+    change_counter(sender, instance, -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+@receiver(pre_delete, sender=User)
+def mark_counter_owner_deleting(sender, instance, **kwargs):
+    mark_deleting(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def unmark_counter_owner_deleting(sender, instance, **kwargs):
+    mark_deleting(instance, deleting=False)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, created, update_fields=None, raw=False,
+                 **kwargs):
+    if raw:
+        return
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_activity(sender, instance)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def remove_recipe_activity(sender, instance, **kwargs):
+    remove_activity(sender, instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def choose_feed_delivery(sender, instance, raw=False, **kwargs):
+    """Рецепты популярных авторов подмешиваются в ленты при чтении."""
+    if instance._state.adding and not raw:
+        instance.in_feeds = fans_out(instance.author)
+
+
+@receiver(post_save, sender=Recipe)
+def deliver_to_feeds(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.in_feeds:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_author_to_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(sender, instance, **kwargs):
+    remove_author_from_feed(instance.user_id, instance.author_id)
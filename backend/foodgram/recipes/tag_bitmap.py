@@ -0,0 +1,35 @@
+from collections import defaultdict
+
+from recipes.models import Recipe, Tag
+
+# Знаковый BIGINT: старший бит не используем.
+MAX_TAG_BITS = 63
+CHUNK_SIZE = 1000
+
+
+def free_bit():
+    """Наименьший свободный номер бита или None, если биты закончились."""
+    used = set(Tag.objects.filter(bit__isnull=False).values_list(
+        'bit', flat=True))
+    return next((bit for bit in range(MAX_TAG_BITS) if bit not in used),
+                None)
+
+
+def refresh_tags_mask(recipe_ids):
+    """Пересчитывает битовую маску тегов для указанных рецептов."""
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[start:start + CHUNK_SIZE]
+        masks = defaultdict(int)
+        for recipe_id, bit in Recipe.tags.through.objects.filter(
+                recipe_id__in=chunk, tag__bit__isnull=False
+        ).values_list('recipe_id', 'tag__bit'):
+            masks[recipe_id] |= 1 << bit
+        Recipe.objects.bulk_update(
+            [Recipe(pk=pk, tags_mask=masks[pk]) for pk in chunk],
+            ['tags_mask'],
+        )
+
+
+def rebuild_tags_masks():
+    refresh_tags_mask(Recipe.objects.values_list('pk', flat=True).iterator())
@@ -0,0 +1,327 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from itertools import combinations
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.counters import reconcile_counters
+from recipes.feed import feed_keys
+from recipes.models import (Favorite, FeedEntry, Ingredient, Recipe,
+                            RecipePopularity, ShoppingCart, Tag)
+from recipes.popularity import add_scores, decay, refresh_popularity
+from recipes.search import filter_search, search_recipes
+from users.models import Follow, User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f'{username}@example.com', username=username,
+        password='password', first_name=username, last_name=username)
+
+
+def create_recipe(author, number):
+    # author загружается заново: fans_out смотрит на его followers_count.
+    return Recipe.objects.create(
+        author=User.objects.get(pk=author.pk), name=f'Рецепт {number}',
+        text='Описание', cooking_time=10)
+
+
+def walk_feed(user, page_size):
+    """Id рецептов ленты, прочитанной страницами по ключу."""
+    ids, after = [], None
+    while keys := feed_keys(user, after, page_size):
+        ids.extend(pk for _, pk in keys)
+        after = keys[-1]
+    return ids
+
+
+@override_settings(FEED_FANOUT_LIMIT=2, FEED_BACKFILL_LIMIT=2)
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = create_user('reader')
+        self.author = create_user('author')
+        self.popular = create_user('popular')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.popular)
+        Follow.objects.create(user=create_user('fan'), author=self.popular)
+
+    def test_feed_merges_written_and_pulled_recipes_across_pages(self):
+        recipes = [
+            create_recipe((self.author, self.popular)[number % 2], number)
+            for number in range(7)
+        ]
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 4)
+        self.assertFalse(Recipe.objects.filter(
+            author=self.popular, in_feeds=True).exists())
+        expected = [recipe.pk for recipe in reversed(recipes)]
+        for page_size in (1, 2, 3, 7, 10):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(walk_feed(self.reader, page_size), expected)
+
+    def test_recipes_older_than_backfill_are_pulled(self):
+        author = create_user('prolific')
+        recipes = [create_recipe(author, number) for number in range(5)]
+        Follow.objects.create(user=self.reader, author=author)
+        self.assertEqual(FeedEntry.objects.filter(
+            user=self.reader, recipe__author=author).count(), 2)
+        expected = [recipe.pk for recipe in reversed(recipes)]
+        for page_size in (1, 2, 3, 5):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(walk_feed(self.reader, page_size), expected)
+
+    def test_feed_pages_follow_next_cursor(self):
+        recipes = [
+            create_recipe((self.author, self.popular)[number % 2], number)
+            for number in range(5)
+        ]
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        ids, url = [], '/api/recipes/feed/?limit=2'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, [recipe.pk for recipe in reversed(recipes)])
+
+    def test_invalid_feed_cursor(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get('/api/recipes/feed/?cursor=bm90LWEtY3Vyc29y')
+        self.assertEqual(response.status_code, 404)
+
+
+class TagBitmapTests(TestCase):
+    def setUp(self):
+        self.tags = [
+            Tag.objects.create(name=f'Тег {number}', color='#FFFFFF',
+                               slug=f'tag-{number}')
+            for number in range(3)
+        ]
+        author = create_user('author')
+        self.recipes = [create_recipe(author, number) for number in range(5)]
+        first, second, third = self.tags
+        self.recipes[0].tags.set([first])
+        self.recipes[1].tags.set([first, second])
+        self.recipes[2].tags.set([third])
+        self.recipes[3].tags.add(second, third)
+        self.recipes[3].tags.remove(third)
+        third.recipe_set.add(self.recipes[4])
+
+    def assert_same_as_join(self):
+        tags = list(Tag.objects.all())
+        for size in range(1, len(tags) + 1):
+            for selected in combinations(tags, size):
+                with self.subTest(tags=[tag.slug for tag in selected]):
+                    self.assertQuerysetEqual(
+                        Recipe.objects.with_any_tag(selected).order_by('pk'),
+                        Recipe.objects.filter(
+                            tags__in=selected).distinct().order_by('pk'),
+                        transform=lambda recipe: recipe)
+
+    def test_bitmap_matches_join(self):
+        self.assertEqual(len({tag.bit for tag in self.tags}), 3)
+        self.assert_same_as_join()
+
+    def test_bitmap_follows_tag_changes(self):
+        self.tags[1].recipe_set.clear()
+        self.recipes[0].tags.clear()
+        self.tags[2].delete()
+        self.assert_same_as_join()
+
+    def test_tag_without_bit_uses_join(self):
+        Tag.objects.filter(pk=self.tags[0].pk).update(bit=None)
+        self.assert_same_as_join()
+        tag = Tag.objects.get(pk=self.tags[0].pk)
+        self.assertEqual(tag.mask, 0)
+
+
+class DataInFileTests(TestCase):
+    ROWS = [('абрикосы', 'г'), ('соль', 'г'), ('соль', 'щепотка'),
+            ('"кавычки", запятые', 'мл')]
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = os.path.join(directory.name, 'ingredients.csv')
+        with open(self.csv_path, 'w', encoding='utf-8', newline='') as file:
+            csv.writer(file).writerows(self.ROWS)
+        self.json_path = os.path.join(directory.name, 'ingredients.json')
+        with open(self.json_path, 'w', encoding='utf-8') as file:
+            json.dump([{'name': name, 'measurement_unit': unit}
+                       for name, unit in self.ROWS],
+                      file, ensure_ascii=False, indent=2)
+
+    def load(self, path):
+        output = StringIO()
+        call_command('data_in_file', path=path, chunk_size=2, stdout=output)
+        return output.getvalue()
+
+    def ingredients(self):
+        return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+    def test_rerun_adds_nothing(self):
+        for path in (self.csv_path, self.json_path, self.csv_path):
+            with self.subTest(path=os.path.basename(path)):
+                output = self.load(path)
+                self.assertEqual(self.ingredients(), set(self.ROWS))
+        self.assertIn('добавлено 0, пропущено 4', output)
+
+    def test_json_split_across_reads(self):
+        with mock.patch('recipes.management.commands.data_in_file.'
+                        'JSON_READ_SIZE', 7):
+            self.load(self.json_path)
+        self.assertEqual(self.ingredients(), set(self.ROWS))
+
+    def test_search_sees_loaded_ingredients(self):
+        url = '/api/ingredients/?name=соль'
+        self.assertEqual(APIClient().get(url).json(), [])
+        self.load(self.csv_path)
+        self.assertEqual(
+            sorted(item['measurement_unit']
+                   for item in APIClient().get(url).json()),
+            ['г', 'щепотка'])
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{number}') for number in range(3)]
+        self.recipe = create_recipe(self.author, 1)
+        create_recipe(self.author, 2)
+        for reader in self.readers:
+            Favorite.objects.create(user=reader, recipe=self.recipe)
+            Follow.objects.create(user=reader, author=self.author)
+        ShoppingCart.objects.create(user=self.readers[0], recipe=self.recipe)
+
+    def counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        return (recipe.favorites_count, recipe.shopping_carts_count,
+                author.recipes_count, author.followers_count)
+
+    def test_counters_follow_relations(self):
+        self.assertEqual(self.counters(), (3, 1, 2, 3))
+        Favorite.objects.filter(user=self.readers[0]).delete()
+        ShoppingCart.objects.all().delete()
+        Follow.objects.get(user=self.readers[1]).delete()
+        self.assertEqual(self.counters(), (2, 0, 2, 2))
+        self.readers[2].delete()
+        self.assertEqual(self.counters(), (1, 0, 2, 1))
+
+    def test_stale_instance_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        Favorite.objects.filter(user=self.readers[0]).delete()
+        Follow.objects.create(user=create_user('late'), author=self.author)
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Новое имя'
+        author.save()
+        self.assertEqual(self.counters(), (2, 1, 2, 4))
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).name,
+                         'Новое название')
+
+    def test_reconcile_fixes_drift(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            favorites_count=10, shopping_carts_count=0)
+        User.objects.filter(pk=self.author.pk).update(
+            recipes_count=0, followers_count=7)
+        drift = reconcile_counters(dry_run=True)
+        self.assertEqual(sum(drift.values()), 4)
+        self.assertEqual(self.counters(), (10, 0, 0, 7))
+        self.assertEqual(reconcile_counters(), drift)
+        self.assertEqual(self.counters(), (3, 1, 2, 3))
+        self.assertEqual(sum(reconcile_counters(dry_run=True).values()), 0)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        author = create_user('author')
+        self.soup = Recipe.objects.create(
+            author=author, name='Борщ украинский', text='Свёкла и капуста',
+            cooking_time=90)
+        self.salad = Recipe.objects.create(
+            author=author, name='Винегрет', text='Борщевая свёкла',
+            cooking_time=20)
+        Recipe.objects.create(author=author, name='Омлет', text='Яйца',
+                              cooking_time=10)
+
+    def search(self, query):
+        return list(search_recipes(Recipe.objects.all(), query))
+
+    def test_words_match_by_prefix(self):
+        self.assertEqual(self.search('борщ'), [self.soup, self.salad])
+        self.assertEqual(self.search('укр борщ'), [self.soup])
+        self.assertEqual(
+            set(filter_search(Recipe.objects.all(), 'свёк')),
+            {self.soup, self.salad})
+
+    def test_query_without_words(self):
+        self.assertEqual(self.search('!!'), [])
+        self.assertEqual(self.search('"*:&'), [])
+
+
+@override_settings(POPULARITY_HALF_LIFE_HOURS=24,
+                   POPULARITY_FAVORITE_WEIGHT=1.0,
+                   POPULARITY_SHOPPING_CART_WEIGHT=0.5)
+class PopularityTests(TestCase):
+    def setUp(self):
+        author = create_user('author')
+        self.readers = [create_user(f'reader{number}') for number in range(2)]
+        self.recipes = [create_recipe(author, number) for number in range(3)]
+
+    def add(self, model, user, recipe, age):
+        event = model.objects.create(user=user, recipe=recipe)
+        model.objects.filter(pk=event.pk).update(
+            created_at=self.now - age)
+
+    def scores(self):
+        return dict(RecipePopularity.objects.values_list(
+            'recipe_id', 'score'))
+
+    def test_refresh_counts_old_and_recent_events(self):
+        self.now = timezone.now()
+        first, second, third = self.recipes
+        self.add(Favorite, self.readers[0], first, timedelta(hours=48))
+        self.add(Favorite, self.readers[1], first, timedelta(seconds=10))
+        self.add(ShoppingCart, self.readers[0], second, timedelta(hours=24))
+        self.add(Favorite, self.readers[0], third, timedelta(days=30))
+        self.assertEqual(refresh_popularity(self.now), 2)
+        scores = self.scores()
+        self.assertEqual(set(scores), {first.pk, second.pk})
+        self.assertAlmostEqual(
+            scores[first.pk],
+            decay(timedelta(hours=48)) + decay(timedelta(seconds=10)))
+        self.assertAlmostEqual(scores[second.pk], 0.25)
+
+    def test_recipe_deleted_before_lock_is_skipped(self):
+        self.now = timezone.now()
+        first, second, _ = self.recipes
+        self.add(Favorite, self.readers[0], first, timedelta(hours=1))
+        self.add(Favorite, self.readers[0], second, timedelta(hours=1))
+        passes = []
+
+        def add_scores_then_delete(*args, **kwargs):
+            add_scores(*args, **kwargs)
+            if not passes:
+                first.delete()
+            passes.append(args)
+
+        with mock.patch('recipes.popularity.add_scores',
+                        add_scores_then_delete):
+            self.assertEqual(refresh_popularity(self.now), 1)
+        self.assertEqual(len(passes), 2)
+        self.assertEqual(set(self.scores()), {second.pk})
@@ -0,0 +1,8 @@
+from itertools import islice
+
+
+def batched(iterable, size):
+    """Пачки по size элементов из итератора."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -1,14 +1,23 @@
 from django.contrib import admin
 
+from recipes.paginator import EstimatedCountPaginator
+
 from .models import Follow, User
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'email', 'username', 'first_name', 'last_name',)
+    list_display = ('id', 'email', 'username', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
     search_fields = ('username', 'email',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='feed_pull_before',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Рецепты старше даты читаются в ленту из рецептов автора'),
+        ),
+    ]
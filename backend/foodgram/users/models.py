@@ -1,10 +1,39 @@
 from django.conf import settings
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Value
 
 from .validators import validate_username
 
+USER_COUNTERS = ('recipes_count', 'followers_count')
+
+
+def fields_without_counters(instance, counters, update_fields):
+    """Поля для сохранения существующей строки, кроме счётчиков.
+
+    Счётчики меняются атомарными UPDATE (recipes/counters.py); значение,
+    загруженное вместе с объектом, к моменту save() могло устареть.
+    """
+    if instance._state.adding or update_fields is not None:
+        return update_fields
+    return [field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in counters]
+
+
+class UserQuerySet(models.QuerySet):
+    def with_is_subscribed(self, user):
+        """Добавляет флаг подписки текущего пользователя на каждого автора."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=BooleanField()))
+        return self.annotate(is_subscribed=Exists(Follow.objects.filter(
+            user=user, author=OuterRef('pk'))))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class User(AbstractUser):
     email = models.EmailField(
@@ -36,6 +65,18 @@ class User(AbstractUser):
         related_name='api_users',
         blank=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    objects = CustomUserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
@@ -47,6 +88,11 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = fields_without_counters(
+            self, USER_COUNTERS, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -59,6 +105,11 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+    feed_pull_before = models.DateTimeField(
+        'Рецепты старше даты читаются в ленту из рецептов автора',
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         unique_together = ('user', 'author')
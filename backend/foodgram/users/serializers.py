@@ -69,6 +69,17 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return user
 
 
+def get_followed_author_ids(request):
+    """Id авторов, на которых подписан пользователь; один запрос на request."""
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    if not hasattr(request, '_followed_author_ids'):
+        request._followed_author_ids = frozenset(
+            Follow.objects.filter(user=request.user).values_list(
+                'author_id', flat=True))
+    return request._followed_author_ids
+
+
 class UserGetSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -79,11 +90,9 @@ class UserGetSerializer(UserSerializer):
                   )
 
     def get_is_subscribed(self, obj):
-        user_id = self.context.get('request').user.id
-        return Follow.objects.filter(
-            author=obj.id,
-            user=user_id
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_followed_author_ids(self.context.get('request'))
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -1,12 +1,15 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from api.pagination import CustomPagination
 from api.serializers import SubscriptionsSerializer
+from recipes.models import Recipe
 
 from .models import Follow, User
 from .permissions import IsAuthorOrAdminOrReadOnly
@@ -18,6 +21,9 @@ class CustomUserViewSet(UserViewSet):
     serializer_class = UserGetSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
 
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
+
 
 class SubscriptionsViewSet(CustomUserViewSet):
     queryset = User.objects.all()
@@ -27,8 +33,22 @@ class SubscriptionsViewSet(CustomUserViewSet):
     @action(methods=['get'], detail=True, url_path='subscriptions',
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        subscriptions = User.objects.filter(following__user=request.user).all()
-        paginator = PageNumberPagination()
+        recipes_limit = request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.filter(author__following__user=request.user)
+        if recipes_limit is not None:
+            if not recipes_limit.isdigit() or int(recipes_limit) < 1:
+                return Response(
+                    {'errors': 'recipes_limit должен быть целым числом '
+                               'больше 0'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            recipes = recipes.top_per_author(int(recipes_limit))
+        subscriptions = User.objects.filter(
+            following__user=request.user
+        ).with_is_subscribed(request.user).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        )
+        paginator = CustomPagination()
         paginated_subscriptions = paginator.paginate_queryset(subscriptions,
                                                               request)
         serializer = self.get_serializer(paginated_subscriptions, many=True)
@@ -36,6 +56,7 @@ class SubscriptionsViewSet(CustomUserViewSet):
 
     @action(methods=['post', 'delete'], detail=True, url_path='subscribe',
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def subscribe(self, request, id=None):
         if request.method == 'POST':
             author = get_object_or_404(User, id=id)